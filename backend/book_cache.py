@@ -0,0 +1,138 @@
+# Bounded in-process response cache for the E-Book Manager backend
+#
+# Maps a key (e.g. an ISBN) to already-encoded response bytes. Entries expire
+# after a TTL, and the least recently used entries are evicted once the total
+# size passes max_bytes. Misses can be cached too, with their own shorter TTL,
+# so repeated lookups of a missing key do not all reach the database.
+#
+# CatalogVersion backs the ETags of the read endpoints: any write bumps it, so
+# a client holding the current tag can be answered 304 without a query.
+
+import time
+import uuid
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping cost counted against max_bytes
+ENTRY_OVERHEAD = 100
+
+MISSING = object()
+
+
+class ResponseCache:
+    def __init__(self, max_bytes, ttl, negative_ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, body or MISSING, size)
+        self.size = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return cached bytes, MISSING for a cached miss, or None if not cached"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, body, size = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if body is MISSING:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return body
+
+    def set(self, key, body):
+        self._store(key, body, len(body) + len(key) + ENTRY_OVERHEAD, self.ttl)
+
+    def set_missing(self, key):
+        self._store(key, MISSING, len(key) + ENTRY_OVERHEAD, self.negative_ttl)
+
+    def _store(self, key, body, size, ttl):
+        if size > self.max_bytes or ttl <= 0:
+            return
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, body, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            old_key, _ = next(iter(self._entries.items()))
+            self._drop(old_key)
+            self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def invalidate(self, *keys):
+        for key in keys:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class CatalogVersion:
+    """Monotonic counter bumped on every catalog write, rendered as a strong ETag
+
+    The tag includes a random per-process epoch so tags from different
+    processes (or from before a restart) never compare equal.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+
+    def bump(self):
+        self.version += 1
+        return self.version
+
+    def etag(self, coding=None):
+        """Tag of the current version; a body sent with a content-coding gets its own tag"""
+        if coding:
+            return f'"{self.epoch}-{self.version}-{coding}"'
+        return f'"{self.epoch}-{self.version}"'
+
+    def matching_tag(self, if_none_match):
+        """The tag in an If-None-Match header value that names the current version, or None"""
+        if not if_none_match:
+            return None
+        current = self.etag()
+        if if_none_match.strip() == "*":
+            return current
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == current or tag.startswith(current[:-1] + "-"):
+                return tag
+        return None
+
+    def matches(self, if_none_match):
+        """True if an If-None-Match header value names the current version"""
+        return self.matching_tag(if_none_match) is not None
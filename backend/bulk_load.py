@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Offline bulk loader for the E-Book Manager catalog
+
+Loads Books.csv / books.json style files straight into PostgreSQL without
+going through the HTTP API:
+
+1. The file is split into chunks of records; a process pool parses and
+   normalizes the chunks in parallel (same rules as /import-books).
+2. Normalized rows are staged with binary COPY (asyncpg copy_records_to_table)
+   into a temporary table.
+3. One INSERT ... SELECT ... ON CONFLICT statement merges the staging table
+   into books, either skipping or updating existing ISBNs, and records the
+   merged rows in the book_changes log so running servers pick them up.
+
+Usage:
+  python bulk_load.py ../Books.csv ../books.json
+  python bulk_load.py dump.csv --workers 8 --on-conflict update --rebuild-indexes
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import asyncpg
+
+from import_parsers import (
+    csv_record,
+    iter_csv_lines,
+    iter_file_chunks,
+    iter_json_array,
+    map_csv_header,
+    normalize_book,
+)
+
+# normalize_book() keys, in the order rows are staged
+ROW_KEYS = ["isbn", "title", "author", "year", "publisher", "cover", "genre", "price", "rating"]
+
+
+def prepare_chunk(header, items):
+    """Parse and normalize one chunk in a worker process
+
+    items are raw CSV record strings when header is given, otherwise
+    already-decoded JSON records. Returns (rows, invalid_count).
+    """
+    if header is not None:
+        items = [csv_record(header, row) for row in csv.reader(items) if row]
+    rows = []
+    invalid = 0
+    for item in items:
+        try:
+            book = normalize_book(item) if isinstance(item, dict) else None
+        except ValueError:
+            book = None
+        if book is None:
+            invalid += 1
+            continue
+        # Binary COPY needs exact types: NUMERIC columns take Decimal
+        for key in ("price", "rating"):
+            if book[key] is not None:
+                book[key] = Decimal(str(book[key]))
+        rows.append(tuple(book[key] for key in ROW_KEYS))
+    return rows, invalid
+
+
+async def iter_chunks(path, chunk_size):
+    """Yield (header, items) chunks for prepare_chunk from a .csv or .json file"""
+    if path.lower().endswith(".csv"):
+        header = None
+        chunk = []
+        async for line in iter_csv_lines(iter_file_chunks(path)):
+            if header is None:
+                header = map_csv_header(next(csv.reader([line])))
+                continue
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+    else:
+        chunk = []
+        async for record in iter_json_array(iter_file_chunks(path)):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield None, chunk
+                chunk = []
+        if chunk:
+            yield None, chunk
+
+
+async def secondary_indexes(conn, table):
+    """Indexes on table that are not backing a primary key or constraint"""
+    return await conn.fetch(
+        """
+        SELECT i.relname AS name, pg_get_indexdef(i.oid) AS definition
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = $1::regclass
+          AND NOT x.indisprimary
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+        """,
+        table,
+    )
+
+
+def merge_statement(table, columns, on_conflict, change_table):
+    column_list = ", ".join(columns)
+    if on_conflict == "update":
+        values = [c for c in columns if c != "isbn"]
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in values)
+        # Rows that would not change are left alone, so they are not logged
+        # as updates either
+        current = ", ".join(f"{table}.{c}" for c in values)
+        incoming = ", ".join(f"EXCLUDED.{c}" for c in values)
+        action = f"DO UPDATE SET {updates} WHERE ({current}) IS DISTINCT FROM ({incoming})"
+    else:
+        action = "DO NOTHING"
+    # DISTINCT ON keeps one staged row per ISBN; DO UPDATE cannot touch a row twice.
+    # Every merged row is recorded in the change log in the same statement;
+    # xmax = 0 tells a freshly inserted row from an updated one.
+    return (
+        f"WITH merged AS ("
+        f"INSERT INTO {table} ({column_list}) "
+        f"SELECT DISTINCT ON (isbn) {column_list} FROM books_stage ORDER BY isbn "
+        f"ON CONFLICT (isbn) {action} "
+        f"RETURNING isbn, (xmax = 0) AS inserted) "
+        f"INSERT INTO {change_table} (isbn, op) "
+        f"SELECT isbn, CASE WHEN inserted THEN 'insert' ELSE 'update' END FROM merged"
+    )
+
+
+def report(label, count, started):
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"{label}: {count} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
+async def load(args):
+    from main import Book, BookChange, CHANGE_LOG_LOCK_ID, DATABASE_URL
+
+    table = Book.__tablename__
+    columns = [getattr(Book, key).name for key in ROW_KEYS]
+    dsn = args.database_url or DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(
+            f"CREATE TEMP TABLE books_stage (LIKE {table} INCLUDING DEFAULTS) ON COMMIT PRESERVE ROWS"
+        )
+        started = time.perf_counter()
+        staged = invalid = 0
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            pending = deque()
+
+            async def stage(future):
+                nonlocal staged, invalid
+                rows, bad = await future
+                invalid += bad
+                if rows:
+                    await conn.copy_records_to_table("books_stage", records=rows, columns=columns)
+                    staged += len(rows)
+
+            for path in args.paths:
+                print(f"Reading {path}")
+                async for header, items in iter_chunks(path, args.chunk_size):
+                    pending.append(loop.run_in_executor(pool, prepare_chunk, header, items))
+                    # Keep every worker busy without queueing the whole file
+                    if len(pending) >= args.workers * 2:
+                        await stage(pending.popleft())
+            while pending:
+                await stage(pending.popleft())
+        report("Parsed and staged", staged, started)
+        if invalid:
+            print(f"Skipped {invalid} invalid records")
+
+        started = time.perf_counter()
+        async with conn.transaction():
+            dropped = []
+            if args.rebuild_indexes:
+                dropped = await secondary_indexes(conn, table)
+                for index in dropped:
+                    print(f"Dropping index {index['name']}")
+                    await conn.execute(f'DROP INDEX "{index["name"]}"')
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", CHANGE_LOG_LOCK_ID)
+            status = await conn.execute(
+                merge_statement(table, columns, args.on_conflict, BookChange.__tablename__)
+            )
+            merged = int(status.split()[-1])
+            for index in dropped:
+                print(f"Rebuilding index {index['name']}")
+                await conn.execute(index["definition"])
+        report("Merged into books", merged, started)
+        print(f"{staged - merged} staged rows were duplicates or already present"
+              if args.on_conflict == "skip" else f"{merged} rows inserted or updated")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load books into PostgreSQL with COPY")
+    parser.add_argument("paths", nargs="+", help=".csv (Books.csv layout) or .json (books.json layout) files")
+    parser.add_argument("--database-url", help="asyncpg DSN (default: DATABASE_URL from main.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="parser processes")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="records per parse/COPY chunk")
+    parser.add_argument("--on-conflict", choices=["skip", "update"], default="skip",
+                        help="what to do with ISBNs that already exist (default: skip)")
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="drop secondary indexes on books before the merge and recreate them after")
+    args = parser.parse_args()
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"File not found: {path}")
+            sys.exit(1)
+    asyncio.run(load(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# In-process fan-out of catalog change notifications for Server-Sent Events
+#
+# Every subscriber gets a small bounded queue. Publishing never waits: a
+# subscriber whose queue is full is dropped (it receives a final "dropped"
+# event and should reconnect and resync) instead of buffering without limit.
+# Changes are coalesced over a short window, so an import that commits many
+# batches produces a handful of events rather than one per batch.
+
+import asyncio
+import json
+
+DROPPED = object()
+
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class EventHub:
+    def __init__(self, queue_size=16, coalesce_interval=0.25, max_isbns=100):
+        self.queue_size = queue_size
+        self.coalesce_interval = coalesce_interval
+        self.max_isbns = max_isbns
+        self.subscribers = set()
+        self.dropped = 0
+        self.published = 0
+        self._pending = []
+        self._pending_seen = set()
+        self._pending_count = 0
+        self._truncated = False
+        self._version = None
+        self._flush_handle = None
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event):
+        """Send an event to every subscriber, dropping the ones that fell behind"""
+        self.published += 1
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber):
+        self.subscribers.discard(subscriber)
+        subscriber.dropped = True
+        self.dropped += 1
+        # Make room for the sentinel so the consumer wakes up and closes
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(DROPPED)
+
+    def books_changed(self, isbns, version):
+        """Queue ISBNs for the next coalesced "books_changed" event"""
+        if not self.subscribers:
+            return
+        for isbn in isbns:
+            self._pending_count += 1
+            if isbn in self._pending_seen:
+                continue
+            if len(self._pending) < self.max_isbns:
+                self._pending_seen.add(isbn)
+                self._pending.append(isbn)
+            else:
+                self._truncated = True
+        self._version = version
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_interval, self._flush)
+
+    def catalog_reset(self, version, changes):
+        """Tell subscribers to refetch everything: too many books changed to list them"""
+        if not self.subscribers:
+            return
+        self.publish({"type": "books_changed", "version": version, "changes": changes, "isbns": [], "truncated": True})
+
+    def _flush(self):
+        self._flush_handle = None
+        if not self._pending_count:
+            return
+        event = {
+            "type": "books_changed",
+            "version": self._version,
+            "changes": self._pending_count,
+            "isbns": self._pending,
+            # More ISBNs changed than fit in one event; refetch instead
+            "truncated": self._truncated,
+        }
+        self._truncated = False
+        self._pending = []
+        self._pending_seen = set()
+        self._pending_count = 0
+        self.publish(event)
+
+    def stats(self):
+        return {"subscribers": len(self.subscribers), "published": self.published, "dropped": self.dropped}
+
+
+def format_sse(event, event_id=None):
+    """Encode an event dict as one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event['type']}")
+    lines.append("data: " + json.dumps(event, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
@@ -0,0 +1,125 @@
+# Pre-encoded full-catalog snapshot for the E-Book Manager backend
+#
+# The unfiltered catalog listing is kept ready to send: the JSON body is
+# encoded once, together with gzip and (if the brotli package is installed)
+# brotli variants. Writes only mark the snapshot stale; it is rebuilt in the
+# background, and requests fall back to the normal query path until the new
+# snapshot is ready, so nobody is ever served an outdated catalog.
+#
+# Rows are streamed and encoded chunk by chunk off the event loop. A rebuild
+# stops as soon as the body passes max_bytes; from then on the catalog is
+# considered too large and no further rebuilds are scheduled.
+
+import asyncio
+import contextlib
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip and identity still work
+    brotli = None
+
+
+def choose_encoding(accept_encoding, available):
+    """Pick the best content coding from an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CatalogSnapshot:
+    def __init__(self, iter_rows, encode_rows, catalog_version, max_bytes, debounce=0.05):
+        """iter_rows() -> async iterator of row chunks; encode_rows(rows) -> comma joined JSON objects"""
+        self.iter_rows = iter_rows
+        self.encode_rows = encode_rows
+        self.catalog_version = catalog_version
+        self.max_bytes = max_bytes
+        self.debounce = debounce
+        self.version = None
+        self.etags = {}  # content coding -> ETag of that variant
+        self.variants = {}  # content coding (None for identity) -> body bytes
+        self.too_large = False
+        self.builds = 0
+        self._task = None
+        self._again = False
+
+    def is_current(self):
+        return bool(self.variants) and self.version == self.catalog_version.version
+
+    def body(self, accept_encoding):
+        """Return (body, content_coding) for the best variant the client accepts"""
+        encoding = choose_encoding(accept_encoding, self.variants)
+        return self.variants[encoding], encoding
+
+    def _compress(self, body):
+        variants = {None: body, "gzip": gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=5)
+        return variants
+
+    async def _encode(self):
+        """The JSON array of the whole catalog, or None once it passes max_bytes"""
+        parts = []
+        size = 2  # the brackets
+        async with contextlib.aclosing(self.iter_rows()) as chunks:
+            async for rows in chunks:
+                if not rows:
+                    continue
+                # Formatting and encoding are CPU bound; keep them off the event loop
+                part = await asyncio.to_thread(self.encode_rows, rows)
+                size += len(part) + (1 if parts else 0)
+                if size > self.max_bytes:
+                    return None
+                parts.append(part)
+        return b"[" + b",".join(parts) + b"]"
+
+    async def rebuild(self):
+        version = self.catalog_version.version
+        etags = {coding: self.catalog_version.etag(coding) for coding in (None, "gzip", "br")}
+        body = await self._encode()
+        if body is None:
+            print(f"[DEBUG] Catalog is over {self.max_bytes} bytes, serving it from the database")
+            self.too_large = True
+            self.variants = {}
+            return
+        variants = await asyncio.to_thread(self._compress, body)
+        self.version, self.etags, self.variants = version, etags, variants
+        self.builds += 1
+
+    def schedule(self):
+        """Rebuild in the background; bursts of writes share one rebuild"""
+        if self.too_large:
+            return
+        if self._task is not None and not self._task.done():
+            self._again = True
+            return
+        self._task = asyncio.get_running_loop().create_task(self._rebuild_loop())
+
+    async def _rebuild_loop(self):
+        while True:
+            self._again = False
+            await asyncio.sleep(self.debounce)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                print(f"[ERROR] Failed to rebuild catalog snapshot: {str(e)}")
+            if not self._again or self.too_large:
+                return
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,3 +1,122 @@
 # Configuration for E-Book Manager
 # Add your password here
 PASSWORD = "123"
+
+# Pagination for GET /books
+BOOKS_PAGE_SIZE = 100
+BOOKS_MAX_PAGE_SIZE = 1000
+# Rows fetched per server-side cursor round trip when streaming /books
+BOOKS_STREAM_CHUNK_SIZE = 1000
+
+# Seconds between checks of sessions.pkl for changes made by other processes
+SESSION_FILE_CHECK_INTERVAL = 2.0
+# Session lifetime; with sliding expiry every authenticated request extends it
+SESSION_TTL_SECONDS = 8 * 60 * 60
+SESSION_SLIDING_EXPIRY = False
+# Maximum number of live sessions; the least recently used one is evicted first
+SESSION_MAX_LIVE = 10000
+# Seconds between sweeps for expired tokens, and tokens checked per batch
+SESSION_SWEEP_INTERVAL = 60
+SESSION_SWEEP_BATCH_SIZE = 1000
+
+# Token issued by /login: "opaque" (random token kept in the session store)
+# or "signed" (stateless HMAC-signed token, no store lookup; not sliding)
+AUTH_TOKEN_MODE = "opaque"
+# Signing keys by key id. None derives the key from PASSWORD; set a string to
+# use a dedicated secret. To rotate, add a new id, make it active, and remove
+# the old id once its tokens have expired.
+TOKEN_SIGNING_KEYS = {"k1": None}
+TOKEN_ACTIVE_KEY_ID = "k1"
+
+# Where opaque session tokens live: "file" (sessions.pkl, single worker) or
+# "sqlite" (shared database in WAL mode, safe with several uvicorn workers)
+SESSION_BACKEND = "file"
+SESSION_SQLITE_PATH = None  # defaults to backend/sessions.db
+# Per-worker cache of validated tokens for the sqlite backend; a token removed
+# by another worker stops working after at most SESSION_CACHE_TTL seconds
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 5.0
+
+# Records per multi-row INSERT ... ON CONFLICT DO NOTHING during imports.
+# Each row binds 9 parameters and asyncpg allows at most 32767 per statement.
+IMPORT_BATCH_SIZE = 1000
+# Parsed batches allowed to wait for the database before the parser pauses
+IMPORT_MAX_PENDING_BATCHES = 2
+# Writer tasks per import job, and the cap on batches in flight across all
+# jobs (each holds one pooled connection while it runs)
+IMPORT_JOB_WORKERS = 2
+IMPORT_MAX_CONCURRENT_BATCHES = 2
+# Jobs allowed to run at once; later ones wait as "queued"
+IMPORT_MAX_CONCURRENT_JOBS = 2
+# Finished jobs kept for GET /import-jobs/{id}
+IMPORT_JOB_HISTORY = 100
+
+# Read cache for GET /books/{isbn}: total size of cached responses, how long a
+# book stays cached, and how long a "not found" answer is remembered
+BOOK_CACHE_MAX_BYTES = 16 * 1024 * 1024
+BOOK_CACHE_TTL = 300
+BOOK_CACHE_NEGATIVE_TTL = 5
+# Largest encoded catalog kept as a pre-encoded snapshot for GET /books?all=true
+CATALOG_SNAPSHOT_MAX_BYTES = 256 * 1024 * 1024
+
+# Delta sync change log: how often each worker checks it for writes made by
+# other processes, and how many of the most recent entries are kept
+CHANGE_LOG_POLL_INTERVAL = 2.0
+CHANGE_LOG_RETENTION = 100000
+# Change log rows read per query while polling; past RESYNC_THRESHOLD pending
+# changes a worker clears its caches and rebuilds its indexes instead
+CHANGE_LOG_POLL_BATCH = 10000
+CHANGE_LOG_RESYNC_THRESHOLD = 50000
+
+# Server-Sent Events (/events): pending events per subscriber before it is
+# dropped, how long changes are coalesced into one event, the most ISBNs
+# listed in one event, keepalive and client reconnect intervals
+EVENTS_QUEUE_SIZE = 16
+EVENTS_COALESCE_INTERVAL = 0.25
+EVENTS_MAX_ISBNS = 100
+EVENTS_KEEPALIVE = 15
+EVENTS_RETRY_MS = 3000
+
+# Deepest result offset GET /books/search will page to
+SEARCH_MAX_OFFSET = 10000
+# Recent search queries whose top SEARCH_CACHE_DEPTH hits are kept in memory
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_DEPTH = 1000
+
+# Most suggestions GET /books/suggest returns, and the widest prefix range it
+# ranks per request before caching that prefix's top suggestions
+SUGGEST_MAX_K = 10
+SUGGEST_SCAN_LIMIT = 64
+
+# A failed search/suggest index build is retried after this many seconds,
+# doubling up to the maximum. While no index is ready, at most
+# INDEX_PENDING_MAX changed books are queued; past that the next build
+# covers them instead.
+INDEX_BUILD_RETRY_DELAY = 1.0
+INDEX_BUILD_RETRY_MAX_DELAY = 60.0
+INDEX_PENDING_MAX = 100000
+
+# Width in years of the year buckets in /books?facets=true
+FACET_YEAR_BUCKET = 10
+
+# Apply pending schema migrations (query indexes, see migrations.py) in the
+# background when the server starts
+MIGRATE_ON_STARTUP = True
+
+# Largest k accepted by GET /books/top
+TOP_MAX_K = 100
+
+# Most ISBNs accepted by one POST /books/batch request
+BOOKS_BATCH_MAX = 500
+
+# Most books accepted by one POST /books:bulk request (written as one statement)
+BOOKS_BULK_MAX = 1000
+
+# Group commit for /add-book: concurrent requests are queued and inserted
+# together, one statement per WRITE_COALESCE_MAX_ROWS rows or per
+# WRITE_COALESCE_MAX_DELAY seconds, with at most WRITE_COALESCE_MAX_FLUSHES
+# groups being written at once
+WRITE_COALESCING = False
+WRITE_COALESCE_MAX_ROWS = 200
+WRITE_COALESCE_MAX_DELAY = 0.005
+WRITE_COALESCE_MAX_FLUSHES = 2
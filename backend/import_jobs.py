@@ -0,0 +1,233 @@
+# Background import jobs for the E-Book Manager backend
+#
+# An import job runs as its own asyncio task, independent of the request that
+# submitted it, so it keeps going if the client disconnects. Records are
+# grouped into batches which a small pool of writer tasks sends to the
+# database concurrently. A semaphore shared by all jobs caps how many batches
+# are in flight at once, which keeps imports from taking every pooled
+# connection away from the interactive endpoints.
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+from import_parsers import ImportParseError
+
+# Keep at most this many batch error messages per job
+MAX_JOB_ERRORS = 50
+
+
+class ImportJob:
+    def __init__(self, source):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.processed = 0
+        self.imported = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.failed = 0
+        self.batches = []
+        self.errors = []
+        self.error = None
+        self.task = None
+        self._cancel = asyncio.Event()
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def cancel(self):
+        """Ask the job to stop at the next batch boundary"""
+        if not self.done:
+            self._cancel.set()
+            self.status = "cancelling" if self.status == "running" else self.status
+
+    def _record(self, report, size):
+        self.batches.append(report)
+        self.processed += size
+        self.imported += report["inserted"]
+        self.invalid += report["invalid"]
+        if "error" in report:
+            self.failed += report["skipped"]
+            if len(self.errors) < MAX_JOB_ERRORS:
+                self.errors.append(f"batch {report['batch']}: {report['error']}")
+        else:
+            self.skipped += report["skipped"]
+
+    def summary(self):
+        """Counts in the format the synchronous import endpoints return"""
+        summary = {
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+        if self.error:
+            summary["error"] = self.error
+        return summary
+
+    def status_report(self):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "source": self.source,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "processed": self.processed,
+            "rows_per_second": round(self.processed / elapsed, 1) if elapsed > 0 else 0.0,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "batches": len(self.batches),
+            "errors": self.errors,
+            "error": self.error,
+        }
+
+
+class ImportJobManager:
+    def __init__(self, import_batch, batch_size, workers=2, max_pending_batches=2,
+                 max_concurrent_batches=2, max_concurrent_jobs=2, history=100):
+        """import_batch(number, records) -> (report, inserted) writes one batch"""
+        self.import_batch = import_batch
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_pending_batches = max_pending_batches
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.history = history
+        self.jobs = OrderedDict()
+        self._batch_slots = None
+        self._job_slots = None
+
+    def _semaphores(self):
+        # Created lazily so they bind to the running event loop
+        if self._batch_slots is None:
+            self._batch_slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._job_slots = asyncio.Semaphore(self.max_concurrent_jobs)
+        return self._batch_slots, self._job_slots
+
+    def submit(self, records, source, cleanup=None):
+        """Start a job over records (a list or async iterable) and return it immediately
+
+        cleanup, if given, is awaited once the job has finished.
+        """
+        job = ImportJob(source)
+        self.jobs[job.id] = job
+        self._prune()
+        job.task = asyncio.get_running_loop().create_task(self._run(job, records, cleanup))
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job, records, cleanup):
+        batch_slots, job_slots = self._semaphores()
+        try:
+            async with job_slots:
+                if job._cancel.is_set():
+                    job.status = "cancelled"
+                    return
+                job.status = "running"
+                job.started_at = time.time()
+                await self._pipeline(job, records, batch_slots)
+                if job._cancel.is_set():
+                    job.status = "cancelled"
+                elif job.error:
+                    job.status = "failed"
+                else:
+                    job.status = "completed"
+        except Exception as e:
+            print(f"[ERROR] Import job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        finally:
+            job.finished_at = time.time()
+            if cleanup is not None:
+                await cleanup()
+
+    async def _pipeline(self, job, records, batch_slots):
+        queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        failure = []
+
+        def stopping():
+            return job._cancel.is_set() or bool(failure)
+
+        async def writer():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                if stopping():
+                    continue  # drain without writing so the producer never blocks
+                number, batch = item
+                try:
+                    async with batch_slots:
+                        report, _ = await self.import_batch(number, batch)
+                except Exception as e:
+                    failure.append(str(e))
+                    continue
+                job._record(report, len(batch))
+
+        async def iterate():
+            if hasattr(records, "__aiter__"):
+                async for record in records:
+                    yield record
+            else:
+                for record in records:
+                    yield record
+
+        writers = [asyncio.create_task(writer()) for _ in range(self.workers)]
+        batch = []
+        number = 0
+        try:
+            try:
+                async for record in iterate():
+                    if stopping():
+                        break
+                    batch.append(record if isinstance(record, dict) else {})
+                    if len(batch) >= self.batch_size:
+                        number += 1
+                        await queue.put((number, batch))
+                        batch = []
+            except ImportParseError as e:
+                # Keep what was parsed before the error; report where it stopped
+                job.error = str(e)
+            if batch and not stopping():
+                number += 1
+                await queue.put((number, batch))
+            for _ in writers:
+                await queue.put(None)
+            await asyncio.gather(*writers)
+        except BaseException:
+            for task in writers:
+                task.cancel()
+            raise
+        job.batches.sort(key=lambda report: report["batch"])
+        if failure:
+            job.error = failure[0]
+
+    async def shutdown(self):
+        """Cancel running jobs; call from the app's shutdown hook"""
+        tasks = [job.task for job in self.jobs.values() if job.task and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
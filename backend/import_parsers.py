@@ -0,0 +1,212 @@
+# Incremental parsers and record normalization for book imports
+#
+# Both parsers consume an async iterable of byte chunks (e.g. a request body
+# or a file read in pieces) and yield one record dict at a time, so only the
+# record currently being parsed has to be held in memory.
+
+import asyncio
+import codecs
+import csv
+import json
+
+# Books.csv column headers -> API field names. Columns that already use the
+# API names are accepted as well.
+CSV_HEADER_MAP = {
+    "ISBN": "ISBN",
+    "Book-Title": "title",
+    "Book-Author": "author",
+    "Year-Of-Publication": "year",
+    "Publisher": "publisher",
+    "Image-URL-M": "cover",
+    "Genre": "genre",
+    "Price": "price",
+    "Rating": "rating",
+    "title": "title",
+    "author": "author",
+    "year": "year",
+    "publisher": "publisher",
+    "cover": "cover",
+    "genre": "genre",
+    "price": "price",
+    "rating": "rating",
+}
+
+# Refuse to buffer more than this much of a single unfinished record
+MAX_RECORD_CHARS = 1024 * 1024
+
+
+class ImportParseError(ValueError):
+    pass
+
+
+# Fields a record must have to be imported
+IMPORT_REQUIRED_FIELDS = ["ISBN", "title", "author", "year", "publisher", "cover"]
+
+
+def normalize_book(book):
+    """Map an API/import record to Book column values, raising ValueError if it is invalid"""
+    for field in IMPORT_REQUIRED_FIELDS:
+        if field not in book:
+            raise ValueError(f"Missing field: {field}")
+    year = book["year"]
+    try:
+        price_value = float(book.get("price")) if book.get("price") else None
+        rating_value = float(book.get("rating")) if book.get("rating") else None
+        year_value = int(year) if year not in (None, "") else None
+    except (TypeError, ValueError):
+        raise ValueError("Year, price and rating must be valid numbers")
+    return {
+        "isbn": book["ISBN"],
+        "title": book["title"],
+        "author": book["author"],
+        "year": year_value,
+        "publisher": book["publisher"],
+        "cover": book["cover"],
+        "genre": book.get("genre", ""),
+        "price": price_value,
+        "rating": rating_value,
+    }
+
+
+async def iter_file_chunks(path, chunk_size=64 * 1024):
+    """Read a file in chunks without blocking the event loop"""
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def _iter_text(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+async def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array as they are completed"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    offset = 0  # characters dropped from the front of buf, for error messages
+    state = "start"  # start -> value -> separator -> ... -> end
+    eof = False
+    text_chunks = _iter_text(chunks).__aiter__()
+
+    while True:
+        # Skip whitespace, pulling more text whenever the buffer runs out
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(buf):
+            offset += len(buf)
+            buf, pos = "", 0
+            try:
+                buf = await text_chunks.__anext__()
+            except StopAsyncIteration:
+                if state == "end":
+                    return
+                raise ImportParseError("Unexpected end of JSON input")
+            continue
+
+        if state == "start":
+            if buf[pos] != "[":
+                raise ImportParseError("Expected a JSON array of books")
+            pos += 1
+            state = "first"
+        elif state in ("first", "value"):
+            if state == "first" and buf[pos] == "]":
+                pos += 1
+                state = "end"
+                continue
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                incomplete = True
+            else:
+                # A scalar that ends at or just before the buffer end may be
+                # cut short: "2." or "1e+" decode as 2 and 1
+                incomplete = len(buf) - end <= 2 and not isinstance(value, (dict, list)) and not eof
+            if incomplete:
+                if eof:
+                    raise ImportParseError(f"Invalid JSON near character {offset + pos}")
+                if len(buf) - pos > MAX_RECORD_CHARS:
+                    raise ImportParseError("JSON record too large")
+                offset += pos
+                try:
+                    buf = buf[pos:] + await text_chunks.__anext__()
+                except StopAsyncIteration:
+                    eof = True
+                    buf = buf[pos:]
+                pos = 0
+                continue
+            pos = end
+            state = "separator"
+            yield value
+        elif state == "separator":
+            if buf[pos] == ",":
+                state = "value"
+            elif buf[pos] == "]":
+                state = "end"
+            else:
+                raise ImportParseError(f"Expected ',' or ']' near character {offset + pos}")
+            pos += 1
+        else:
+            raise ImportParseError("Unexpected data after the JSON array")
+
+
+async def iter_csv_lines(chunks):
+    """Yield complete CSV records as text, joining lines inside quoted fields"""
+    pending = ""
+    record = ""
+    async for text in _iter_text(chunks):
+        pending += text
+        lines = pending.split("\n")
+        pending = lines.pop()
+        if len(pending) > MAX_RECORD_CHARS:
+            # No newline for that long (or only CR line breaks)
+            raise ImportParseError("CSV record too large")
+        for line in lines:
+            record += line + "\n"
+            # An odd number of quotes means a quoted field spans the newline
+            if record.count('"') % 2 == 0:
+                yield record
+                record = ""
+            elif len(record) > MAX_RECORD_CHARS:
+                raise ImportParseError("CSV record too large")
+    record += pending
+    if record.strip():
+        yield record
+
+
+async def iter_csv_records(chunks):
+    """Yield one API-style record dict per CSV row, mapping Books.csv headers"""
+    header = None
+    async for line in iter_csv_lines(chunks):
+        row = next(csv.reader([line]), [])
+        if not row:
+            continue
+        if header is None:
+            header = map_csv_header(row)
+            continue
+        yield csv_record(header, row)
+
+
+def map_csv_header(row):
+    """Translate a CSV header row to API field names (None for unknown columns)"""
+    header = [CSV_HEADER_MAP.get(name.strip()) for name in row]
+    if "ISBN" not in header:
+        raise ImportParseError("CSV header must include an ISBN column")
+    return header
+
+
+def csv_record(header, row):
+    return {name: value for name, value in zip(header, row) if name is not None}
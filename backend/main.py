@@ -1,52 +1,96 @@
 # FastAPI backend for E-Book Manager
 # Requirements: fastapi, uvicorn, asyncpg, sqlalchemy
 
-from fastapi import FastAPI, HTTPException, Depends, Request, Header
+from fastapi import FastAPI, HTTPException, Depends, Request, Header, Query, Response, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, String, Integer, Numeric
+from sqlalchemy import Column, String, Integer, Numeric, BigInteger, DateTime, func, insert, delete, case, literal_column, any_, literal, or_
 from sqlalchemy.future import select
+from sqlalchemy.dialects import postgresql, sqlite
 import os
 import json
+import asyncio
+import tempfile
 import config
 import base64
+import time
+from typing import List, Literal, Optional
+from decimal import Decimal, InvalidOperation
 
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 import secrets
-import pickle
+from session_store import SessionStore, SqliteSessionStore, read_tokens, write_tokens
+from signed_tokens import TokenSigner, derive_key
+from import_parsers import iter_csv_records, iter_file_chunks, iter_json_array, normalize_book
+from import_jobs import ImportJobManager
+from book_cache import MISSING, CatalogVersion, ResponseCache
+from catalog_snapshot import CatalogSnapshot
+from catalog_events import DROPPED, EventHub, format_sse
+from search_index import SearchIndex
+from suggest_index import SuggestIndex
+from migrations import migrate
+from schemas import BookIn, error_message
+from write_coalescer import WriteCoalescer
+from serialization import FastJSONResponse, encode_json, format_value, row_formatter
+from single_flight import SingleFlight, single_flight
+from pydantic import ValidationError
 
 security = HTTPBasic()
 
-# Simple in-memory session store
+# In-memory session store, persisted to sessions.pkl in the background
 SESSIONS_FILE = os.path.join(os.path.dirname(__file__), "sessions.pkl")
 
 def load_sessions():
-    try:
-        with open(SESSIONS_FILE, "rb") as f:
-            sessions_data = pickle.load(f)
-            # Ensure we always return a set, regardless of what was stored
-            if isinstance(sessions_data, list):
-                sessions = set(sessions_data)
-            elif isinstance(sessions_data, set):
-                sessions = sessions_data
-            else:
-                sessions = set()
-            print("[DEBUG] Loaded sessions from file:", sessions)  # Debug log
-            return sessions
-    except Exception as e:
-        print("[DEBUG] Failed to load sessions:", str(e))  # Debug log
-        return set()
+    """Return the set of unexpired tokens currently stored in sessions.pkl"""
+    now = time.time()
+    return {token for token, expires_at in read_tokens(SESSIONS_FILE, config.SESSION_TTL_SECONDS).items() if expires_at > now}
 
 def save_sessions(sessions):
+    """Store a set of tokens; tokens already stored keep their expiry, new ones get a fresh TTL"""
     try:
-        with open(SESSIONS_FILE, "wb") as f:
-            pickle.dump(list(sessions), f)
-            print("[DEBUG] Saved sessions to file:", sessions)  # Debug log
+        if not isinstance(sessions, dict):
+            stored = read_tokens(SESSIONS_FILE, config.SESSION_TTL_SECONDS)
+            expires_at = time.time() + config.SESSION_TTL_SECONDS
+            sessions = {token: stored.get(token, expires_at) for token in sessions}
+        write_tokens(SESSIONS_FILE, sessions, config.SESSION_TTL_SECONDS)
     except Exception as e:
         print("[DEBUG] Failed to save sessions:", str(e))  # Debug log
 
-sessions = load_sessions()
+if config.SESSION_BACKEND == "sqlite":
+    # Shared between uvicorn workers
+    session_store = SqliteSessionStore(
+        config.SESSION_SQLITE_PATH or os.path.join(os.path.dirname(__file__), "sessions.db"),
+        ttl=config.SESSION_TTL_SECONDS,
+        sliding=config.SESSION_SLIDING_EXPIRY,
+        max_sessions=config.SESSION_MAX_LIVE,
+        sweep_interval=config.SESSION_SWEEP_INTERVAL,
+        sweep_batch_size=config.SESSION_SWEEP_BATCH_SIZE,
+        cache_size=config.SESSION_CACHE_SIZE,
+        cache_ttl=config.SESSION_CACHE_TTL,
+    )
+else:
+    session_store = SessionStore(
+        SESSIONS_FILE,
+        check_interval=config.SESSION_FILE_CHECK_INTERVAL,
+        ttl=config.SESSION_TTL_SECONDS,
+        sliding=config.SESSION_SLIDING_EXPIRY,
+        max_sessions=config.SESSION_MAX_LIVE,
+        sweep_interval=config.SESSION_SWEEP_INTERVAL,
+        sweep_batch_size=config.SESSION_SWEEP_BATCH_SIZE,
+    )
+session_store.load()
+
+# Signed tokens: a key configured as None is derived from config.PASSWORD
+token_signer = TokenSigner(
+    {
+        kid: derive_key(secret or config.PASSWORD, kid)
+        for kid, secret in config.TOKEN_SIGNING_KEYS.items()
+    },
+    config.TOKEN_ACTIVE_KEY_ID,
+    config.SESSION_TTL_SECONDS,
+)
 
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
@@ -73,7 +117,19 @@ class Book(Base):
     price = Column("price", Numeric(10, 2))  # Numeric type to match database schema
     rating = Column("rating", Numeric(3, 1))  # Numeric type to match database schema
 
-app = FastAPI()
+class BookChange(Base):
+    """Append-only log of writes to books, for /books/changes delta sync"""
+    __tablename__ = "book_changes"
+    seq = Column("seq", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    isbn = Column("isbn", String, nullable=False)
+    op = Column("op", String, nullable=False)  # "insert" or "update"
+    changed_at = Column("changed_at", DateTime(timezone=True), server_default=func.now())
+
+# Advisory lock held while writing the change log, so sequence numbers
+# become visible in commit order and delta readers never skip a change
+CHANGE_LOG_LOCK_ID = 0x626F6F6B
+
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -81,33 +137,156 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# API field name -> Book column, in the order the fields appear in responses
+BOOK_FIELDS = {
+    "ISBN": Book.isbn,
+    "title": Book.title,
+    "author": Book.author,
+    "year": Book.year,
+    "publisher": Book.publisher,
+    "cover": Book.cover,
+    "genre": Book.genre,
+    "price": Book.price,
+    "rating": Book.rating,
+}
+
+# Row of every BOOK_FIELDS column -> full response dict
+format_book_row = row_formatter(tuple(BOOK_FIELDS))
+
+def parse_fields(fields):
+    """Parse a comma separated ?fields= projection, defaulting to every field"""
+    if not fields:
+        return list(BOOK_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in BOOK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return requested
+
+def encode_cursor(key):
+    """Encode the keyset position of the last row on a page as an opaque token"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Columns listings can be sorted on; each has an ascending (column, isbn)
+# index, a partial descending one and a descending NULLS LAST one (see
+# migrations.py)
+SORT_FIELDS = {"rating": Book.rating, "price": Book.price, "year": Book.year}
+
+class BookOrder:
+    """Listing order: ?sort=rating (ascending) or ?sort=-rating, ties broken by ISBN
+
+    Without a sort key books are listed by ISBN. Books that have no value
+    for the key come last in either direction, in ISBN order; with
+    include_unset=False they are left out instead.
+    """
+
+    def __init__(self, sort=None, include_unset=True):
+        self.sort = sort
+        self.include_unset = include_unset
+        self.name = None
+        self.column = None
+        self.descending = False
+        if sort and sort not in ("ISBN", "isbn"):
+            name = sort[1:] if sort.startswith("-") else sort
+            if name not in SORT_FIELDS:
+                raise HTTPException(status_code=400, detail=f"Cannot sort by {name}; use one of: {', '.join(SORT_FIELDS)}")
+            self.name = name
+            self.column = SORT_FIELDS[name]
+            self.descending = sort.startswith("-")
+
+    def apply(self, query):
+        if self.column is None:
+            return query.order_by(Book.isbn)
+        key = self.column.desc() if self.descending else self.column.asc()
+        if not self.include_unset:
+            return query.where(self.column.isnot(None)).order_by(key, Book.isbn)
+        return query.order_by(key.nulls_last(), Book.isbn)
+
+    def page_queries(self, query, cursor=None):
+        """Ordered queries that together list the rows after a cursor from encode()
+
+        query is the unordered selection. Each returned query is one range
+        on a sort index; run them in turn until the page is full. Past a
+        cursor, a sorted listing reads the rest of the value range first and
+        then the books without a value.
+        """
+        if cursor is None:
+            return [self.apply(query)]
+        last = decode_cursor(cursor)
+        if self.column is None:
+            if not isinstance(last, list) or len(last) != 1 or not isinstance(last[0], str):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            return [self.apply(query.where(Book.isbn > last[0]))]
+        # Sorted cursors carry the sort they were issued for
+        if not isinstance(last, list) or len(last) != 3 or last[0] != self.sort or not isinstance(last[2], str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if last[1] is None and self.include_unset:
+            # Already in the tail of books without a value
+            return [self.unset(query, last[2])]
+        try:
+            value = int(last[1]) if self.name == "year" else Decimal(last[1])
+        except (TypeError, ValueError, InvalidOperation):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # The leading bound is what the index range scan starts from; it
+        # also rules out NULLs
+        if self.descending:
+            after = (self.column <= value) & ((self.column < value) | (Book.isbn > last[2]))
+        else:
+            after = (self.column >= value) & ((self.column > value) | (Book.isbn > last[2]))
+        queries = [self.apply(query.where(after))]
+        if self.include_unset:
+            queries.append(self.unset(query))
+        return queries
+
+    def unset(self, query, after_isbn=None):
+        """The books without a value for the sort key, in ISBN order"""
+        query = query.where(self.column.is_(None))
+        if after_isbn is not None:
+            query = query.where(Book.isbn > after_isbn)
+        return query.order_by(Book.isbn)
+
+    def encode(self, isbn, value=None):
+        if self.column is None:
+            return encode_cursor([isbn])
+        if value is not None and self.name != "year":
+            value = str(value)
+        return encode_cursor([self.sort, value, isbn])
+
+@app.on_event("startup")
+async def start_session_store():
+    session_store.start()
+
+@app.on_event("shutdown")
+async def stop_session_store():
+    await session_store.stop()
+
 # Authentication dependency - moved before endpoints that use it
 async def authenticate(authorization: str = Header(None)):
-    # Always reload sessions from disk to get the latest tokens
-    global sessions
-    sessions = load_sessions()
-    print("[DEBUG] Incoming Authorization header:", authorization)
-    print("[DEBUG] Current session tokens:", sessions)
-    
     if not authorization:
         print("[DEBUG] No Authorization header provided")
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     if authorization.startswith("Bearer "):
         token = authorization.split(" ", 1)[1]
-        print("[DEBUG] Extracted Bearer token:", token)
-        print("[DEBUG] Token type:", type(token))
-        print("[DEBUG] Sessions type:", type(sessions))
-        print("[DEBUG] Is token in sessions?:", token in sessions)
-        if token in sessions:
-            print("[DEBUG] Bearer token is valid.")
+        # Signed tokens are accepted in either mode so switching
+        # AUTH_TOKEN_MODE does not log everybody out
+        if TokenSigner.looks_signed(token):
+            valid = token_signer.verify(token)
+        else:
+            valid = await session_store.is_valid(token)
+        if valid:
             return True
         print("[DEBUG] Bearer token is invalid or expired.")
-        print("[DEBUG] All tokens in sessions:")
-        for i, session_token in enumerate(sessions):
-            print(f"[DEBUG]   {i}: {session_token} (type: {type(session_token)})")
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
     if authorization.startswith("Basic "):
@@ -128,71 +307,668 @@ async def authenticate(authorization: str = Header(None)):
             print("[DEBUG] Failed to parse Basic Auth:", str(e))
             raise HTTPException(status_code=401, detail="Invalid Basic Auth format")
     
-    print("[DEBUG] Authorization header format not recognized:", authorization)
+    print("[DEBUG] Authorization header format not recognized")
     raise HTTPException(status_code=401, detail="Not authenticated")
     return True
 
-@app.get("/books")
-async def get_books(auth: bool = Depends(authenticate)):
+async def stream_books(query, selected, ndjson):
+    """Yield the encoded result of query chunk by chunk from a server-side cursor"""
+    first = True
     try:
         async with SessionLocal() as session:
-            result = await session.execute(select(Book))
-            books = result.scalars().all()
-            return [
-                {
-                    "ISBN": b.isbn,
-                    "title": b.title,
-                    "author": b.author,
-                    "year": b.year,
-                    "publisher": b.publisher,
-                    "cover": b.cover,
-                    "genre": b.genre or "",
-                    "price": str(b.price) if b.price is not None else "",
-                    "rating": str(b.rating) if b.rating is not None else ""
-                }
-                for b in books
-            ]
+            result = await session.stream(query.execution_options(yield_per=config.BOOKS_STREAM_CHUNK_SIZE))
+            format_row = row_formatter(tuple(selected))
+            if not ndjson:
+                yield b"["
+            async for rows in result.partitions():
+                encoded = [encode_json(format_row(row)) for row in rows]
+                if ndjson:
+                    yield b"\n".join(encoded) + b"\n"
+                else:
+                    yield (b"" if first else b",") + b",".join(encoded)
+                first = False
+            if not ndjson:
+                yield b"]"
+    except Exception as e:
+        # Headers are already sent at this point, so all we can do is log
+        # and cut the stream short; the client sees a truncated body.
+        print(f"[ERROR] Exception while streaming /books: {str(e)}")
+        raise
+
+class BookFilters:
+    """Catalog filters shared by the listing endpoints, applied as SQL WHERE clauses"""
+
+    def __init__(
+        self,
+        genre: List[str] = Query([]),
+        author: List[str] = Query([]),
+        publisher: List[str] = Query([]),
+        min_year: Optional[int] = None,
+        max_year: Optional[int] = None,
+        min_price: Optional[float] = Query(None, ge=0),
+        max_price: Optional[float] = Query(None, ge=0),
+        min_rating: Optional[float] = Query(None, ge=0, le=5),
+        contains: Optional[str] = Query(None, min_length=1),
+    ):
+        self.clauses = []
+        if contains:
+            # Case-insensitive substring match, served by the trigram indexes
+            self.clauses.append(
+                Book.title.icontains(contains, autoescape=True) | Book.author.icontains(contains, autoescape=True)
+            )
+        # Repeating a parameter (?genre=a&genre=b) matches any of the values
+        for column, values in ((Book.genre, genre), (Book.author, author), (Book.publisher, publisher)):
+            if values:
+                self.clauses.append(column.in_(values) if len(values) > 1 else column == values[0])
+        for column, bound, op in (
+            (Book.year, min_year, "__ge__"),
+            (Book.year, max_year, "__le__"),
+            (Book.price, min_price, "__ge__"),
+            (Book.price, max_price, "__le__"),
+            (Book.rating, min_rating, "__ge__"),
+        ):
+            if bound is not None:
+                self.clauses.append(getattr(column, op)(bound))
+
+    def apply(self, query):
+        return query.where(*self.clauses) if self.clauses else query
+
+def rating_bucket():
+    # Whole stars: 4.0-4.9 -> 4. Spelled out as CASE because FLOOR is not
+    # available everywhere and a cast to integer rounds on PostgreSQL.
+    # Constants are inlined so the expression is identical in SELECT and GROUP BY.
+    return case(
+        *[(Book.rating >= stars, literal_column(str(stars))) for stars in range(5, 0, -1)],
+        else_=case((Book.rating.is_(None), None), else_=literal_column("0")),
+    )
+
+async def facet_counts(session, filters):
+    """Counts per genre, year bucket and rating bucket over the filtered books
+
+    One GROUP BY over all three keys (a few hundred groups at most) is summed
+    up per facet here, which works on every database, unlike GROUPING SETS.
+    """
+    bucket = literal_column(str(int(config.FACET_YEAR_BUCKET)))
+    year_bucket = ((Book.year // bucket) * bucket).label("year_bucket")
+    stars = rating_bucket().label("rating_bucket")
+    query = filters.apply(
+        select(Book.genre, year_bucket, stars, func.count()).group_by(Book.genre, year_bucket, stars)
+    )
+    genres, years, ratings = {}, {}, {}
+    for genre, year, rating, count in await session.execute(query):
+        genre = format_value("genre", genre)
+        genres[genre] = genres.get(genre, 0) + count
+        if year is not None:
+            year = int(year)  # FLOOR() returns a float on PostgreSQL
+            years[year] = years.get(year, 0) + count
+        if rating is not None:
+            rating = int(rating)
+            ratings[rating] = ratings.get(rating, 0) + count
+    return {
+        "genre": dict(sorted(genres.items(), key=lambda item: (-item[1], item[0]))),
+        "year": {str(year): years[year] for year in sorted(years)},
+        "rating": {str(rating): ratings[rating] for rating in sorted(ratings)},
+    }
+
+@app.get("/books")
+async def get_books(
+    request: Request,
+    limit: int = Query(config.BOOKS_PAGE_SIZE, ge=1, le=config.BOOKS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    unpaginated: bool = Query(False, alias="all"),
+    stream: Optional[str] = None,
+    facets: bool = False,
+    sort: Optional[str] = None,
+    filters: BookFilters = Depends(),
+    auth: bool = Depends(authenticate),
+):
+    # Pages are keyset-paginated on (sort key, ISBN) so every page costs the
+    # same index range scan regardless of catalog size. ?all=true restores
+    # the old single-response dump for callers that explicitly ask for it.
+    order = BookOrder(sort)
+    selected = parse_fields(fields)
+    names = list(selected)
+    for name in ["ISBN"] + ([order.name] if order.name else []):
+        if name not in names:
+            names.append(name)  # needed to build the next cursor
+    selection = filters.apply(select(*[BOOK_FIELDS[f] for f in names]))
+    query = order.apply(selection)
+    # Streaming mode dumps the whole catalog without buffering it:
+    # ?stream=ndjson or Accept: application/x-ndjson for one object per line,
+    # ?stream=1 for a regular JSON array.
+    ndjson = stream == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+    if ndjson or stream in ("1", "true", "json"):
+        media_type = "application/x-ndjson" if ndjson else "application/json"
+        return StreamingResponse(stream_books(query, selected, ndjson), media_type=media_type)
+    unchanged = not_modified(request)
+    if unchanged:
+        return unchanged
+    headers = etag_headers()
+    if (unpaginated and not fields and not facets and not filters.clauses and order.column is None
+            and catalog_snapshot.is_current()):
+        body, encoding = catalog_snapshot.body(request.headers.get("accept-encoding"))
+        headers = {"ETag": catalog_snapshot.etags[encoding], "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+    queries = [query] if unpaginated else order.page_queries(selection, cursor)
+    # Identical concurrent requests share one query and one encoding. The
+    # catalog version in the key keeps a request that arrives after a write
+    # from joining a read that started before it.
+    key = (catalog_version.version, tuple(sorted(request.query_params.multi_items())))
+    try:
+        body, next_cursor = await books_page_reads.do(
+            key, load_books_page, queries, selected, names, order, None if unpaginated else limit, facets, filters
+        )
     except Exception as e:
         print(f"[ERROR] Exception in /books: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve books")
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
 
-@app.get("/books/{isbn}")
-async def get_book(isbn: str, auth: bool = Depends(authenticate)):
+books_page_reads = SingleFlight()
+
+async def load_books_page(queries, selected, names, order, limit, facets, filters):
+    """Run /books queries until the page is full; returns (encoded body, next cursor or None)"""
+    rows = []
+    async with SessionLocal() as session:
+        for query in queries:
+            if limit is not None:
+                # One row more than the page tells whether another page follows
+                query = query.limit(limit + 1 - len(rows))
+            rows += (await session.execute(query)).all()
+            if limit is not None and len(rows) > limit:
+                break
+        counts = await facet_counts(session, filters) if facets else None
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = order.encode(
+            last[names.index("ISBN")], last[names.index(order.name)] if order.name else None
+        )
+    format_row = row_formatter(tuple(selected))
+    books = [format_row(row) for row in rows]
+    if facets:
+        # Facet counts cover every book matching the filters, not just this page
+        return encode_json({"books": books, "facets": counts}), next_cursor
+    return encode_json(books), next_cursor
+
+# Encoded /books/{isbn} responses, including short-lived "not found" entries
+book_cache = ResponseCache(
+    max_bytes=config.BOOK_CACHE_MAX_BYTES,
+    ttl=config.BOOK_CACHE_TTL,
+    negative_ttl=config.BOOK_CACHE_NEGATIVE_TTL,
+)
+
+catalog_version = CatalogVersion()
+
+def catalog_changed(isbns):
+    """Record that books were just written; call after every commit"""
+    if isbns:
+        book_cache.invalidate(*isbns)
+        catalog_version.bump()
+        catalog_snapshot.schedule()
+        event_hub.books_changed(isbns, catalog_version.version)
+        schedule_index_update(isbns)
+
+def catalog_reset(changes):
+    """Drop everything derived from the catalog after a change too large to apply book by book"""
+    book_cache.clear()
+    catalog_version.bump()
+    catalog_snapshot.schedule()
+    event_hub.catalog_reset(catalog_version.version, changes)
+    schedule_index_build()
+
+async def iter_catalog_rows():
+    """Yield the whole catalog in ISBN order, one chunk of rows at a time"""
+    async with SessionLocal() as session:
+        result = await session.stream(
+            select(*BOOK_FIELDS.values()).order_by(Book.isbn)
+            .execution_options(yield_per=config.BOOKS_STREAM_CHUNK_SIZE)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+def encode_catalog_rows(rows):
+    """Encode a chunk of rows as comma separated JSON objects"""
+    return b",".join(encode_json(format_book_row(row)) for row in rows)
+
+# Ready-to-send bytes for GET /books?all=true
+catalog_snapshot = CatalogSnapshot(
+    iter_catalog_rows,
+    encode_catalog_rows,
+    catalog_version,
+    max_bytes=config.CATALOG_SNAPSHOT_MAX_BYTES,
+)
+
+@app.on_event("startup")
+async def build_catalog_snapshot():
+    catalog_snapshot.schedule()
+
+@app.on_event("shutdown")
+async def stop_catalog_snapshot():
+    await catalog_snapshot.stop()
+
+def not_modified(request):
+    """304 response if the client already has the current catalog version"""
+    tag = catalog_version.matching_tag(request.headers.get("if-none-match"))
+    if tag is None:
+        return None
+    # Echo the tag that matched, which may be the one of an encoded variant
+    return Response(status_code=304, headers={**etag_headers(), "ETag": tag})
+
+def etag_headers():
+    # no-cache: browsers may keep the response but must revalidate it
+    return {"ETag": catalog_version.etag(), "Cache-Control": "private, no-cache"}
+
+@app.get("/books/top")
+async def top_books(
+    request: Request,
+    by: Literal["rating", "price", "year"] = "rating",
+    order: Literal["asc", "desc"] = "desc",
+    k: int = Query(10, ge=1, le=config.TOP_MAX_K),
+    fields: Optional[str] = None,
+    filters: BookFilters = Depends(),
+    auth: bool = Depends(authenticate),
+):
+    """The k highest (or lowest) books by rating, price or year, e.g. best rated or newest"""
+    unchanged = not_modified(request)
+    if unchanged:
+        return unchanged
+    headers = etag_headers()
+    selected = parse_fields(fields)
+    # Books without a value are not ranked; see the partial sort indexes
+    ranking = BookOrder(("-" if order == "desc" else "") + by, include_unset=False)
+    # An index-ordered LIMIT: reads k index entries, never sorts the table
+    query = ranking.apply(filters.apply(select(*[BOOK_FIELDS[f] for f in selected]))).limit(k)
+    try:
+        async with SessionLocal() as session:
+            result = await session.execute(query)
+            rows = result.all()
+    except Exception as e:
+        print(f"[ERROR] Exception in /books/top: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve books")
+    format_row = row_formatter(tuple(selected))
+    return FastJSONResponse([format_row(row) for row in rows], headers=headers)
+
+@app.get("/books/search")
+async def search_books(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=config.BOOKS_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=config.SEARCH_MAX_OFFSET),
+    auth: bool = Depends(authenticate),
+):
+    """Ranked full-text search over title, author, publisher and genre"""
+    if not search_index.ready:
+        raise HTTPException(status_code=503, detail="Search index is still loading")
+    total, hits = await search_index.search(q, limit, offset)
+    books = {}
+    if hits:
+        try:
+            async with SessionLocal() as session:
+                result = await session.execute(
+                    select(*BOOK_FIELDS.values()).where(isbn_in(isbn for isbn, _ in hits))
+                )
+                for row in result:
+                    books[row[0]] = format_book_row(row)
+        except Exception as e:
+            print(f"[ERROR] Exception in /books/search: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to retrieve books")
+    return FastJSONResponse({
+        "query": q,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "results": [{**books[isbn], "score": score} for isbn, score in hits if isbn in books],
+    })
+
+@app.get("/books/suggest")
+async def suggest_books(
+    prefix: str = Query(..., min_length=1),
+    k: int = Query(config.SUGGEST_MAX_K, ge=1, le=config.SUGGEST_MAX_K),
+    auth: bool = Depends(authenticate),
+):
+    """Typeahead: best rated titles and authors starting with prefix, served from memory"""
+    if not suggest_index.ready:
+        raise HTTPException(status_code=503, detail="Suggestion index is still loading")
+    suggestions = suggest_index.suggest(prefix, k)
+    for suggestion in suggestions:
+        suggestion["rating"] = format_value("rating", suggestion["rating"])
+    return {"prefix": prefix, "suggestions": suggestions}
+
+@app.get("/books/changes")
+async def get_book_changes(
+    since: int = Query(..., ge=0),
+    limit: int = Query(config.BOOKS_MAX_PAGE_SIZE, ge=1, le=config.BOOKS_MAX_PAGE_SIZE),
+    auth: bool = Depends(authenticate),
+):
+    """Books inserted or updated after change log sequence number `since`
+
+    Pass the returned high_water_mark as `since` next time. If `resync` is
+    true the log no longer reaches back to `since`; reload the full catalog
+    and continue from the returned high_water_mark.
+    """
     try:
         async with SessionLocal() as session:
-            result = await session.execute(select(Book).where(Book.isbn == isbn))
-            book = result.scalar_one_or_none()
-            if not book:
-                raise HTTPException(status_code=404, detail="Book not found")
-            return {
-                "ISBN": book.isbn,
-                "title": book.title,
-                "author": book.author,
-                "year": book.year,
-                "publisher": book.publisher,
-                "cover": book.cover,
-                "genre": book.genre or "",
-                "price": str(book.price) if book.price is not None else "",
-                "rating": str(book.rating) if book.rating is not None else ""
-            }
+            bounds = await session.execute(select(func.min(BookChange.seq), func.max(BookChange.seq)))
+            oldest, newest = bounds.one()
+            newest = newest or 0
+            if since > newest or (oldest is not None and since < oldest - 1):
+                return {"since": since, "high_water_mark": newest, "resync": True, "more": False, "changes": []}
+            # A range scan on the primary key: each page costs `limit` log
+            # rows however far behind the client is
+            result = await session.execute(
+                select(BookChange.seq, BookChange.isbn)
+                .where(BookChange.seq > since)
+                .order_by(BookChange.seq)
+                .limit(limit + 1)
+            )
+            rows = result.all()
+            more = len(rows) > limit
+            rows = rows[:limit]
+            # A book written several times in this page is listed once, at
+            # its latest change
+            latest = {}
+            for seq, isbn in rows:
+                latest.pop(isbn, None)
+                latest[isbn] = seq
+            changed = list(latest.items())
+            books = {}
+            if changed:
+                result = await session.execute(
+                    select(*BOOK_FIELDS.values()).where(isbn_in(isbn for isbn, _ in changed))
+                )
+                for row in result:
+                    books[row[0]] = format_book_row(row)
+    except Exception as e:
+        print(f"[ERROR] Exception in /books/changes: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve changes")
+    return {
+        "since": since,
+        "high_water_mark": rows[-1][0] if more else max(newest, since),
+        "resync": False,
+        "more": more,
+        "changes": [
+            {"seq": seq, "ISBN": isbn, "book": books.get(isbn), "deleted": isbn not in books}
+            for isbn, seq in changed
+        ],
+    }
+
+@app.get("/books/{isbn}")
+async def get_book(isbn: str, request: Request, auth: bool = Depends(authenticate)):
+    unchanged = not_modified(request)
+    if unchanged:
+        return unchanged
+    headers = etag_headers()  # taken before the read so a concurrent write is never masked
+    cached = book_cache.get(isbn)
+    if cached is MISSING:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers=headers)
+    try:
+        body = await load_book(isbn)
     except Exception as e:
         print(f"[ERROR] Exception in /books/{isbn}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve book")
+    if body is MISSING:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@single_flight(key=lambda isbn: (catalog_version.version, isbn))
+async def load_book(isbn):
+    """Encoded book or MISSING, stored in book_cache; concurrent misses share one query"""
+    version = catalog_version.version
+    async with SessionLocal() as session:
+        result = await session.execute(select(*BOOK_FIELDS.values()).where(Book.isbn == isbn))
+        row = result.first()
+    # A write committed while we were reading may already have invalidated
+    # this ISBN; caching what we read would bring the old answer back
+    cacheable = catalog_version.version == version
+    if row is None:
+        if cacheable:
+            book_cache.set_missing(isbn)
+        return MISSING
+    body = encode_json(format_book_row(row))
+    if cacheable:
+        book_cache.set(isbn, body)
+    return body
 
+def isbn_in(isbns):
+    """WHERE clause matching any of isbns
 
+    PostgreSQL gets one array parameter (isbn = ANY($1)), so the statement
+    text is the same for every batch size; elsewhere it is a plain IN list.
+    """
+    if engine.dialect.name == "postgresql":
+        return Book.isbn == any_(literal(list(isbns), postgresql.ARRAY(String)))
+    return Book.isbn.in_(list(isbns))
+
+@app.post("/books/batch")
+async def get_books_batch(payload: dict, auth: bool = Depends(authenticate)):
+    """Look up many books at once: {"isbns": [...]} -> {"books": [...], "missing": [...]}"""
+    isbns = payload.get("isbns")
+    if not isinstance(isbns, list) or not all(isinstance(isbn, str) for isbn in isbns):
+        raise HTTPException(status_code=400, detail="isbns must be a list of strings")
+    if len(isbns) > config.BOOKS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {config.BOOKS_BATCH_MAX} ISBNs per request")
+    isbns = list(dict.fromkeys(isbns))
+    # Encoded bodies shared with /books/{isbn}; only cache misses are queried
+    bodies = {}
+    lookup = []
+    for isbn in isbns:
+        cached = book_cache.get(isbn)
+        if cached is None:
+            lookup.append(isbn)
+        elif cached is not MISSING:
+            bodies[isbn] = cached
+    if lookup:
+        version = catalog_version.version
+        try:
+            async with SessionLocal() as session:
+                result = await session.execute(select(*BOOK_FIELDS.values()).where(isbn_in(lookup)))
+                rows = result.all()
+        except Exception as e:
+            print(f"[ERROR] Exception in /books/batch: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to retrieve books")
+        for row in rows:
+            bodies[row[0]] = encode_json(format_book_row(row))
+        # Same rule as load_book(): nothing read across a write is cached
+        if catalog_version.version == version:
+            for isbn in lookup:
+                if isbn in bodies:
+                    book_cache.set(isbn, bodies[isbn])
+                else:
+                    book_cache.set_missing(isbn)
+    missing = [isbn for isbn in isbns if isbn not in bodies]
+    content = b"".join([
+        b'{"books":[',
+        b",".join(bodies[isbn] for isbn in isbns if isbn in bodies),
+        b'],"missing":',
+        encode_json(missing),
+        b"}",
+    ])
+    return Response(content=content, media_type="application/json")
+
+# In-memory indexes kept in sync with the books table. Each one has
+# add(isbn, fields), remove(isbn) and a ready flag; fields maps API field
+# names to raw column values. A full build replaces them all at once.
+def new_catalog_indexes():
+    return (
+        SearchIndex(config.SEARCH_CACHE_SIZE, config.SEARCH_CACHE_DEPTH),
+        SuggestIndex(config.SUGGEST_MAX_K, config.SUGGEST_SCAN_LIMIT),
+    )
+
+search_index, suggest_index = new_catalog_indexes()
+catalog_indexes = [search_index, suggest_index]
+# Set while incremental updates may be applied; cleared during a full build
+catalog_indexes_ready = asyncio.Event()
+pending_index_isbns = set()
+index_update_task = None
+index_build_task = None
+index_build_again = False
+
+def book_fields(row):
+    return dict(zip(BOOK_FIELDS, row))
+
+async def build_catalog_indexes():
+    """Load every book into fresh indexes and swap them in
+
+    Runs at startup and after changes too large to apply book by book.
+    The current indexes keep answering queries meanwhile; updates queued
+    during the build are applied to the new ones after the swap. A failed
+    build is retried with backoff.
+    """
+    global search_index, suggest_index, catalog_indexes, index_build_again
+    delay = config.INDEX_BUILD_RETRY_DELAY
+    while True:
+        index_build_again = False
+        catalog_indexes_ready.clear()
+        # The build reads every book committed so far
+        pending_index_isbns.clear()
+        search, suggest = new_catalog_indexes()
+        indexes = [search, suggest]
+        try:
+            async with SessionLocal() as session:
+                result = await session.stream(
+                    select(*BOOK_FIELDS.values()).execution_options(yield_per=config.BOOKS_STREAM_CHUNK_SIZE)
+                )
+                async for rows in result.partitions():
+                    for row in rows:
+                        fields = book_fields(row)
+                        for index in indexes:
+                            index.add(fields["ISBN"], fields)
+                    await asyncio.sleep(0)  # let requests run between chunks
+            print(f"[DEBUG] Indexed {len(search)} books")
+            for index in indexes:
+                # Indexes may finish the load here (sorting, warming caches);
+                # keep that off the event loop
+                await asyncio.to_thread(setattr, index, "ready", True)
+        except Exception as e:
+            print(f"[ERROR] Failed to build catalog indexes, retrying in {delay}s: {str(e)}")
+            if search_index.ready:
+                # Keep serving (and updating) the old indexes meanwhile
+                catalog_indexes_ready.set()
+                schedule_index_update([])
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.INDEX_BUILD_RETRY_MAX_DELAY)
+            continue
+        search_index, suggest_index, catalog_indexes = search, suggest, indexes
+        catalog_indexes_ready.set()
+        schedule_index_update([])
+        if not index_build_again:
+            return
+
+def schedule_index_build():
+    global index_build_task, index_build_again
+    if index_build_task is not None and not index_build_task.done():
+        index_build_again = True
+        return
+    index_build_task = asyncio.get_running_loop().create_task(build_catalog_indexes())
+
+def schedule_index_update(isbns):
+    """Re-read changed books and apply them to the indexes in the background"""
+    global index_update_task
+    pending_index_isbns.update(isbns)
+    if not catalog_indexes_ready.is_set() and len(pending_index_isbns) > config.INDEX_PENDING_MAX:
+        # Too much to replay; a full build reads all of it anyway
+        pending_index_isbns.clear()
+        schedule_index_build()
+        return
+    if index_update_task is None or index_update_task.done():
+        index_update_task = asyncio.get_running_loop().create_task(apply_index_updates())
+
+async def apply_index_updates():
+    while pending_index_isbns:
+        await catalog_indexes_ready.wait()
+        batch = [pending_index_isbns.pop() for _ in range(min(len(pending_index_isbns), config.IMPORT_BATCH_SIZE))]
+        try:
+            async with SessionLocal() as session:
+                result = await session.execute(select(*BOOK_FIELDS.values()).where(isbn_in(batch)))
+                rows = [book_fields(row) for row in result]
+        except Exception as e:
+            print(f"[ERROR] Failed to update catalog indexes: {str(e)}")
+            pending_index_isbns.update(batch)  # retried on the next write
+            return
+        found = {fields["ISBN"] for fields in rows}
+        for index in catalog_indexes:
+            for fields in rows:
+                index.add(fields["ISBN"], fields)
+            for isbn in batch:
+                if isbn not in found:
+                    index.remove(isbn)
+
+@app.on_event("startup")
+async def start_catalog_indexes():
+    schedule_index_build()
+
+# Fan-out of change notifications to /events subscribers
+event_hub = EventHub(
+    queue_size=config.EVENTS_QUEUE_SIZE,
+    coalesce_interval=config.EVENTS_COALESCE_INTERVAL,
+    max_isbns=config.EVENTS_MAX_ISBNS,
+)
+
+async def authenticate_event_stream(authorization: str = Header(None), token: Optional[str] = None):
+    # EventSource cannot send headers, so /events also takes ?token=
+    if token and not authorization:
+        authorization = f"Bearer {token}"
+    return await authenticate(authorization)
+
+@app.get("/events")
+async def catalog_events(auth: bool = Depends(authenticate_event_stream)):
+    """Server-Sent Events stream of catalog changes
+
+    Sends a "hello" event with the current catalog version, then a
+    "books_changed" event (changed ISBNs and new version) after writes, and
+    a comment line every EVENTS_KEEPALIVE seconds. A client that cannot keep
+    up gets a "dropped" event and is disconnected.
+    """
+    subscriber = event_hub.subscribe()
+
+    async def stream():
+        try:
+            yield f"retry: {config.EVENTS_RETRY_MS}\n\n".encode("utf-8")
+            yield format_sse({"type": "hello", "version": catalog_version.version}, catalog_version.version)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), config.EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if event is DROPPED:
+                    yield format_sse({"type": "dropped"})
+                    return
+                yield format_sse(event, event.get("version"))
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+@app.get("/cache-stats")
+async def cache_stats(auth: bool = Depends(authenticate)):
+    """Hit/miss/eviction counters for sizing the read caches"""
+    return {
+        "book_cache": book_cache.stats(),
+        "single_flight": {"books": books_page_reads.stats(), "book": load_book.flight.stats()},
+    }
 
 @app.post("/login")
 async def login(credentials: HTTPBasicCredentials = Depends(security)):
-    global sessions
     correct_password = config.PASSWORD
     if not secrets.compare_digest(credentials.password, correct_password):
         raise HTTPException(status_code=401, detail="Incorrect password")
-    # Generate a simple session token and reload sessions to ensure consistency
-    token = secrets.token_hex(16)
-    sessions = load_sessions()
-    sessions.add(token)
-    save_sessions(sessions)
-    print("[DEBUG] Generated new token and saved to sessions:", token)
+    if config.AUTH_TOKEN_MODE == "signed":
+        token = token_signer.issue()
+        print("[DEBUG] Issued new signed token")
+    else:
+        # Generate a simple session token; the store persists it in the background
+        token = secrets.token_hex(16)
+        await session_store.add(token)
+        print("[DEBUG] Generated new session token")
     return {"token": token}
 
 @app.get("/test-auth")
@@ -208,42 +984,23 @@ async def add_book(book: dict, auth: bool = Depends(authenticate)):
         for field in required:
             if field not in book:
                 raise HTTPException(status_code=400, detail=f"Missing field: {field}")
+        try:
+            row = normalize_book(book)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
         print("[DEBUG] Adding book to database:", book)
-        
-        # Actually add the book to the database
-        async with SessionLocal() as session:
-            # Check if book with this ISBN already exists
-            existing_book = await session.execute(
-                select(Book).where(Book.isbn == book["ISBN"])
-            )
-            if existing_book.scalar_one_or_none():
-                raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
-            
-            # Create new book with all fields
-            # Convert price and rating to numeric values
-            try:
-                price_value = float(book["price"]) if book["price"] else None
-                rating_value = float(book["rating"]) if book["rating"] else None
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Price and rating must be valid numbers")
-            
-            new_book = Book(
-                isbn=book["ISBN"],
-                title=book["title"],
-                author=book["author"],
-                year=book["year"],
-                publisher=book["publisher"],
-                cover=book["cover"],
-                genre=book["genre"],  # Map "genre" field from request to "genre" model attribute
-                price=price_value,
-                rating=rating_value
-            )
-            
-            session.add(new_book)
-            await session.commit()
-            print("[DEBUG] Book successfully added to database")
-            
+
+        # A single INSERT ... ON CONFLICT DO NOTHING: no separate existence
+        # check, and no window for a concurrent insert of the same ISBN
+        if add_book_coalescer is not None:
+            added = await add_book_coalescer.submit(row)
+        else:
+            added = bool(await insert_books([row]))
+        if not added:
+            raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
+        print("[DEBUG] Book successfully added to database")
+
         return {"message": "Book added successfully"}
     except HTTPException:
         raise
@@ -251,48 +1008,390 @@ async def add_book(book: dict, auth: bool = Depends(authenticate)):
         print("[ERROR] Exception in /add-book:", str(e))
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-@app.post("/import-books")
-async def import_books(auth: bool = Depends(authenticate)):
-    # Import books from books.json
+async def insert_book_group(rows):
+    """Flush for the add-book coalescer: one insert for the group, one result per row"""
+    inserted = set(await insert_books(rows))
+    results = []
+    for row in rows:
+        results.append(row["isbn"] in inserted)
+        inserted.discard(row["isbn"])  # the same ISBN twice in a group: first one wins
+    return results
+
+# Opt-in group commit for concurrent /add-book requests
+add_book_coalescer = WriteCoalescer(
+    insert_book_group,
+    max_rows=config.WRITE_COALESCE_MAX_ROWS,
+    max_delay=config.WRITE_COALESCE_MAX_DELAY,
+    max_flushes=config.WRITE_COALESCE_MAX_FLUSHES,
+) if config.WRITE_COALESCING else None
+
+@app.on_event("shutdown")
+async def stop_add_book_coalescer():
+    if add_book_coalescer is not None:
+        await add_book_coalescer.close()
+
+async def upsert_books(rows):
+    """Insert or update normalized rows in one statement and transaction
+
+    Returns {isbn: "created" | "updated" | "unchanged"}. Rows identical to
+    the stored book are not rewritten, logged or announced.
+    """
+    if not rows:
+        return {}
+    table = Book.__table__
+    values = [{getattr(Book, key).name: value for key, value in row.items()} for row in rows]
+    columns = [name for name in values[0] if name != "isbn"]
+    stmt = insert_statement(table).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["isbn"],
+        set_={name: stmt.excluded[name] for name in columns},
+        where=or_(*[table.c[name].is_distinct_from(stmt.excluded[name]) for name in columns]),
+    )
+    isbns = [value["isbn"] for value in values]
+    async with SessionLocal() as session:
+        written = await write_books(session, stmt, may_update=isbns)
+        await session.commit()
+    catalog_changed(list(written))
+    return {
+        isbn: "unchanged" if isbn not in written else "created" if written[isbn] else "updated"
+        for isbn in isbns
+    }
+
+@app.put("/books/{isbn}")
+async def put_book(isbn: str, response: Response, book: dict = Body(...), auth: bool = Depends(authenticate)):
+    """Create or replace one book"""
+    if book.get("ISBN", isbn) != isbn:
+        raise HTTPException(status_code=400, detail="ISBN in the body does not match the URL")
+    try:
+        row = BookIn.model_validate({**book, "ISBN": isbn}).to_row()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=error_message(e))
     try:
-        with open("../books.json", "r", encoding="utf-8") as f:
-            books = json.load(f)
+        status = (await upsert_books([row]))[isbn]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read books.json: {e}")
-    imported = 0
+        print(f"[ERROR] Exception in PUT /books/{isbn}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    if status == "created":
+        response.status_code = 201
+    return {"ISBN": isbn, "status": status}
+
+@app.post("/books:bulk")
+async def bulk_upsert_books(books: List[dict] = Body(...), auth: bool = Depends(authenticate)):
+    """Create or update many books in one statement, reporting a status per item"""
+    if len(books) > config.BOOKS_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {config.BOOKS_BULK_MAX} books per request")
+    results = []
+    rows = {}
+    for index, book in enumerate(books):
+        item = {"index": index, "ISBN": book.get("ISBN")}
+        try:
+            row = BookIn.model_validate(book).to_row()
+        except ValidationError as e:
+            item.update(status="invalid", error=error_message(e))
+        else:
+            if row["isbn"] in rows:
+                # One statement cannot write the same row twice
+                item.update(status="invalid", error="Duplicate ISBN in request")
+            else:
+                rows[row["isbn"]] = row
+        results.append(item)
+    try:
+        statuses = await upsert_books(list(rows.values()))
+    except Exception as e:
+        print(f"[ERROR] Exception in /books:bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "invalid": 0}
+    for item in results:
+        if "status" not in item:
+            item["status"] = statuses[item["ISBN"]]
+        counts[item["status"]] += 1
+    return {**counts, "results": results}
+
+def insert_statement(table):
+    """Dialect specific INSERT so callers can use on_conflict_do_nothing()"""
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+# Change log sequence numbers written by this process, so the poller can tell
+# them apart from writes made by other workers or the bulk loader
+local_change_seqs = set()
+last_seen_change_seq = 0
+
+async def write_books(session, stmt, may_update=()):
+    """Run an INSERT ... ON CONFLICT into books and log the rows it wrote
+
+    Runs in the caller's transaction; commit right after. Returns
+    {isbn: True if inserted, False if updated}. may_update lists the ISBNs
+    an ON CONFLICT DO UPDATE may update; only SQLite needs it.
+    """
+    table = Book.__table__
+    if engine.dialect.name == "postgresql":
+        # One statement, as in bulk_load.merge_statement(). xmax is 0 only
+        # for rows this statement inserted.
+        merged = stmt.returning(table.c.isbn, literal_column("xmax = 0").label("inserted")).cte("merged")
+        # Counting merged runs the book writes to completion, so the lock is
+        # taken after them and before any change log row gets its sequence
+        # number, as a separate lock statement would be
+        locked = (
+            select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK_ID))
+            .select_from(select(func.count()).select_from(merged).subquery())
+            .cte("locked")
+        )
+        op = case((merged.c.inserted, literal("insert")), else_=literal("update"))
+        result = await session.execute(
+            insert(BookChange)
+            .from_select(["isbn", "op"], select(merged.c.isbn, op).where(select(locked).exists()))
+            .returning(BookChange.seq, BookChange.isbn, BookChange.op)
+        )
+        written = {}
+        for seq, isbn, op in result:
+            local_change_seqs.add(seq)
+            written[isbn] = op == "insert"
+        return written
+    # SQLite has no data-modifying CTEs: write the books, then the log
+    existing = set()
+    if may_update:
+        existing = set((await session.execute(select(Book.isbn).where(isbn_in(may_update)))).scalars())
+    result = await session.execute(stmt.returning(table.c.isbn))
+    written = {isbn: isbn not in existing for isbn in result.scalars()}
+    for op, inserted in (("insert", True), ("update", False)):
+        changes = [{"isbn": isbn, "op": op} for isbn, flag in written.items() if flag is inserted]
+        if changes:
+            result = await session.execute(insert(BookChange).values(changes).returning(BookChange.seq))
+            local_change_seqs.update(row[0] for row in result)
+    return written
+
+async def prepare_change_log():
+    """Create the change log table if needed and start reading after its newest entry"""
+    global last_seen_change_seq
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[BookChange.__table__])
     async with SessionLocal() as session:
-        for book in books:
-            if not all(k in book for k in ["ISBN", "title", "author", "year", "publisher", "cover"]):
-                continue
-            # Check if the book already exists
-            result = await session.execute(select(Book).where(Book.isbn == book["ISBN"]))
-            existing = result.scalar_one_or_none()
-            if existing:
-                continue  # Skip duplicates
-            # Convert price and rating to numeric values for import
+        last_seen_change_seq = (await session.execute(select(func.max(BookChange.seq)))).scalar() or 0
+
+async def poll_change_log():
+    """Pick up catalog writes made by other processes and prune old log entries
+
+    Every write also logs to book_changes, so until the table has been
+    prepared it is retried on every round.
+    """
+    global last_seen_change_seq
+    prepared = False
+    while True:
+        if not prepared:
             try:
-                price_value = float(book.get("price", "0")) if book.get("price") else None
-                rating_value = float(book.get("rating", "0")) if book.get("rating") else None
-            except ValueError:
-                # Skip books with invalid price/rating data
+                await prepare_change_log()
+                prepared = True
+            except Exception as e:
+                print(f"[ERROR] Failed to prepare change log, retrying: {str(e)}")
+                await asyncio.sleep(config.CHANGE_LOG_POLL_INTERVAL)
                 continue
-                
-            new_book = Book(
-                isbn=book["ISBN"],
-                title=book["title"],
-                author=book["author"],
-                year=book["year"],
-                publisher=book["publisher"],
-                cover=book["cover"],
-                genre=book.get("genre", ""),
-                price=price_value,
-                rating=rating_value
-            )
-            session.add(new_book)
-            imported += 1
+        await asyncio.sleep(config.CHANGE_LOG_POLL_INTERVAL)
         try:
-            await session.commit()
+            async with SessionLocal() as session:
+                newest = (await session.execute(select(func.max(BookChange.seq)))).scalar() or 0
+                # Sequence numbers may have gaps, so this overestimates slightly
+                backlog = newest - last_seen_change_seq - len(local_change_seqs)
+                if backlog > config.CHANGE_LOG_RESYNC_THRESHOLD:
+                    # E.g. a bulk_load.py run: cheaper to start over than to
+                    # invalidate and re-read millions of books one by one
+                    print(f"[DEBUG] {backlog} catalog changes since last poll, resetting caches and indexes")
+                    last_seen_change_seq = newest
+                    local_change_seqs.difference_update([seq for seq in local_change_seqs if seq <= newest])
+                    catalog_reset(backlog)
+                while last_seen_change_seq < newest:
+                    result = await session.execute(
+                        select(BookChange.seq, BookChange.isbn)
+                        .where(BookChange.seq > last_seen_change_seq)
+                        .order_by(BookChange.seq)
+                        .limit(config.CHANGE_LOG_POLL_BATCH)
+                    )
+                    rows = result.all()
+                    if not rows:
+                        break
+                    last_seen_change_seq = rows[-1][0]
+                    external = [isbn for seq, isbn in rows if seq not in local_change_seqs]
+                    local_change_seqs.difference_update(seq for seq, _ in rows)
+                    catalog_changed(external)
+                cutoff = last_seen_change_seq - config.CHANGE_LOG_RETENTION
+                if cutoff > 0:
+                    await session.execute(delete(BookChange).where(BookChange.seq <= cutoff))
+                    await session.commit()
         except Exception as e:
-            await session.rollback()
-            raise HTTPException(status_code=400, detail=str(e))
-    return {"imported": imported}
+            print(f"[ERROR] Failed to poll change log: {str(e)}")
+
+change_log_task = None
+
+@app.on_event("startup")
+async def start_migrations():
+    # Indexes are built concurrently and can take a while on a big catalog,
+    # so requests are served in the meantime
+    async def run():
+        try:
+            applied = await migrate(engine)
+            if applied:
+                print(f"[DEBUG] Applied migrations {applied}")
+        except Exception as e:
+            print(f"[ERROR] Failed to apply migrations: {str(e)}")
+    if config.MIGRATE_ON_STARTUP:
+        asyncio.get_running_loop().create_task(run())
+
+@app.on_event("startup")
+async def start_change_log():
+    global change_log_task
+    change_log_task = asyncio.get_running_loop().create_task(poll_change_log())
+
+@app.on_event("shutdown")
+async def stop_change_log():
+    if change_log_task is not None:
+        change_log_task.cancel()
+
+async def insert_books(rows):
+    """Insert normalized rows in one statement and transaction, skipping existing ISBNs
+
+    Returns the list of ISBNs that were actually inserted.
+    """
+    if not rows:
+        return []
+    values = [{getattr(Book, key).name: value for key, value in row.items()} for row in rows]
+    stmt = insert_statement(Book.__table__).values(values).on_conflict_do_nothing(index_elements=["isbn"])
+    async with SessionLocal() as session:
+        inserted = list(await write_books(session, stmt))
+        await session.commit()
+    catalog_changed(inserted)
+    return inserted
+
+async def import_book_batch(number, records):
+    """Validate and insert one batch of raw records, reporting what happened to each"""
+    rows = {}
+    invalid = 0
+    for record in records:
+        try:
+            row = normalize_book(record)
+        except ValueError:
+            invalid += 1
+            continue
+        rows.setdefault(row["isbn"], row)  # first occurrence wins within a batch
+    report = {"batch": number, "inserted": 0, "skipped": len(records) - invalid, "invalid": invalid}
+    try:
+        inserted = await insert_books(list(rows.values()))
+    except Exception as e:
+        # Only this batch is lost; earlier batches are already committed
+        print(f"[ERROR] Import batch {number} failed: {str(e)}")
+        report["error"] = str(e)
+        return report, []
+    report["inserted"] = len(inserted)
+    report["skipped"] -= len(inserted)
+    return report, inserted
+
+import_jobs = ImportJobManager(
+    import_book_batch,
+    batch_size=config.IMPORT_BATCH_SIZE,
+    workers=config.IMPORT_JOB_WORKERS,
+    max_pending_batches=config.IMPORT_MAX_PENDING_BATCHES,
+    max_concurrent_batches=config.IMPORT_MAX_CONCURRENT_BATCHES,
+    max_concurrent_jobs=config.IMPORT_MAX_CONCURRENT_JOBS,
+    history=config.IMPORT_JOB_HISTORY,
+)
+
+@app.on_event("shutdown")
+async def stop_import_jobs():
+    await import_jobs.shutdown()
+
+async def import_book_records(records, source="records"):
+    """Import raw records through an import job and wait for its summary
+
+    The job keeps running if the caller goes away; shield() stops a
+    cancelled request from cancelling the job with it.
+    """
+    job = import_jobs.submit(records, source)
+    await asyncio.shield(job.task)
+    return job.summary()
+
+def books_json_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "books.json")
+
+@app.post("/import-books")
+async def import_books(auth: bool = Depends(authenticate)):
+    # Import books from books.json, read and parsed incrementally
+    path = books_json_path()
+    if not os.path.exists(path):
+        raise HTTPException(status_code=500, detail="Failed to read books.json: file not found")
+    return import_response(await import_book_records(iter_json_array(iter_file_chunks(path)), "books.json"))
+
+def upload_parser(request, format):
+    """Pick the JSON or CSV parser for an upload from ?format= or Content-Type"""
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "json")
+    if fmt == "csv":
+        return iter_csv_records
+    if fmt == "json":
+        return iter_json_array
+    raise HTTPException(status_code=400, detail="format must be 'json' or 'csv'")
+
+@app.post("/import-books/upload")
+async def import_books_upload(request: Request, format: Optional[str] = None, auth: bool = Depends(authenticate)):
+    """Import books from the request body (a JSON array or a Books.csv style file)
+
+    The body is parsed as it arrives and is never held in memory as a whole.
+    The format is taken from ?format=json|csv or the Content-Type header.
+    """
+    parser = upload_parser(request, format)
+    return import_response(await import_book_records(parser(request.stream()), "upload"))
+
+@app.post("/import-jobs", status_code=202)
+async def submit_import_job(request: Request, format: Optional[str] = None, auth: bool = Depends(authenticate)):
+    """Start a background import and return its job id without waiting for it
+
+    With an empty body the job imports books.json. Otherwise the body is
+    spooled to a temporary file first, so the job can outlive the request.
+    """
+    parser = upload_parser(request, format)
+    fd, spool_path = tempfile.mkstemp(prefix="import-", suffix="." + ("csv" if parser is iter_csv_records else "json"))
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            async for chunk in request.stream():
+                size += len(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        os.remove(spool_path)
+        raise
+    async def remove_spool():
+        await asyncio.to_thread(os.remove, spool_path)
+
+    if size:
+        path, source, cleanup = spool_path, "upload", remove_spool
+    else:
+        os.remove(spool_path)
+        path, source, parser, cleanup = books_json_path(), "books.json", iter_json_array, None
+        if not os.path.exists(path):
+            raise HTTPException(status_code=500, detail="Failed to read books.json: file not found")
+    job = import_jobs.submit(parser(iter_file_chunks(path)), source, cleanup=cleanup)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/import-jobs/{job.id}"}
+
+@app.get("/import-jobs")
+async def list_import_jobs(auth: bool = Depends(authenticate)):
+    return [job.status_report() for job in import_jobs.jobs.values()]
+
+@app.get("/import-jobs/{job_id}")
+async def get_import_job(job_id: str, auth: bool = Depends(authenticate)):
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.status_report()
+
+@app.post("/import-jobs/{job_id}/cancel")
+async def cancel_import_job(job_id: str, auth: bool = Depends(authenticate)):
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    job.cancel()
+    return job.status_report()
+
+def import_response(summary):
+    """Turn an import summary into a response, 400 if the input could not be parsed"""
+    if "error" in summary:
+        return JSONResponse(status_code=400, content={"detail": summary["error"], **summary})
+    return summary
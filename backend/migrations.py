@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the E-Book Manager backend
+
+Migrations are numbered and applied in order; each applied version is
+recorded in the schema_migrations table, so every migration runs once per
+database. They mostly create the indexes behind the /books query paths:
+
+- btree composites (column, isbn) for the filters and keyset pagination
+- partial (column DESC, isbn) indexes for the top-rated / newest shelves
+- (column DESC NULLS LAST, isbn) indexes for descending sorted listings
+- pg_trgm GIN indexes for substring matches on title and author
+
+On PostgreSQL every index is built with CREATE INDEX CONCURRENTLY, outside a
+transaction, so a live catalog keeps serving reads and writes during the
+build. An interrupted concurrent build leaves an INVALID index behind; it is
+dropped and rebuilt on the next run. Steps that a database cannot run (GIN,
+extensions on SQLite) are skipped there.
+
+The server applies pending migrations in the background at startup
+(MIGRATE_ON_STARTUP in config.py); they can also be run by hand:
+
+  python migrations.py            # apply pending migrations
+  python migrations.py status     # list migrations and whether they are applied
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import text
+
+# pg_advisory_lock key, so only one process migrates at a time ("migr")
+MIGRATION_LOCK_ID = 0x6D696772
+
+
+class CreateIndex:
+    def __init__(self, name, columns, using=None, where=None, table="books", dialects=None):
+        self.name = name
+        self.columns = columns
+        self.using = using
+        self.where = where
+        self.table = table
+        self.dialects = dialects
+
+    def sql(self, dialect):
+        if self.dialects is not None and dialect not in self.dialects:
+            return None  # column options this database cannot index
+        if dialect == "postgresql":
+            create = "CREATE INDEX CONCURRENTLY IF NOT EXISTS"
+        elif self.using is None:
+            create = "CREATE INDEX IF NOT EXISTS"
+        else:
+            return None  # index method not available on this database
+        using = f" USING {self.using}" if self.using else ""
+        where = f" WHERE {self.where}" if self.where else ""
+        return f"{create} {self.name} ON {self.table}{using} ({self.columns}){where}"
+
+    async def apply(self, conn, dialect):
+        statement = self.sql(dialect)
+        if statement is None:
+            return False
+        if dialect == "postgresql":
+            invalid = await conn.execute(
+                text(
+                    "SELECT 1 FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid "
+                    "WHERE c.relname = :name AND NOT x.indisvalid"
+                ),
+                {"name": self.name},
+            )
+            if invalid.first() is not None:
+                print(f"[DEBUG] Dropping invalid index {self.name} left by an interrupted build")
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.name}"))
+        print(f"[DEBUG] Building index {self.name}")
+        await conn.execute(text(statement))
+        return True
+
+
+class CreateExtension:
+    def __init__(self, name):
+        self.name = name
+
+    async def apply(self, conn, dialect):
+        if dialect != "postgresql":
+            return False
+        await conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {self.name}"))
+        return True
+
+
+class Migration:
+    def __init__(self, version, name, steps):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+
+MIGRATIONS = [
+    Migration(1, "books filter indexes", [
+        CreateIndex("ix_books_genre_isbn", "genre, isbn"),
+        CreateIndex("ix_books_author_isbn", "author, isbn"),
+        CreateIndex("ix_books_publisher_isbn", "publisher, isbn"),
+        CreateIndex("ix_books_year_isbn", "year, isbn"),
+        CreateIndex("ix_books_price_isbn", "price, isbn"),
+        CreateIndex("ix_books_rating_isbn", "rating, isbn"),
+    ]),
+    Migration(2, "books descending sort indexes", [
+        # Shelves list the highest values first and never include unset ones
+        CreateIndex("ix_books_rating_desc", "rating DESC, isbn", where="rating IS NOT NULL"),
+        CreateIndex("ix_books_year_desc", "year DESC, isbn", where="year IS NOT NULL"),
+        CreateIndex("ix_books_price_desc", "price DESC, isbn", where="price IS NOT NULL"),
+    ]),
+    Migration(3, "books trigram text indexes", [
+        CreateExtension("pg_trgm"),
+        CreateIndex("ix_books_title_trgm", "title gin_trgm_ops", using="gin"),
+        CreateIndex("ix_books_author_trgm", "author gin_trgm_ops", using="gin"),
+    ]),
+    Migration(4, "books descending sort indexes with unset values last", [
+        # Sorted /books listings put books without a value last in either
+        # direction; ascending order is already served by the filter indexes.
+        # SQLite cannot index NULLS LAST.
+        CreateIndex("ix_books_rating_desc_nulls_last", "rating DESC NULLS LAST, isbn", dialects=("postgresql",)),
+        CreateIndex("ix_books_year_desc_nulls_last", "year DESC NULLS LAST, isbn", dialects=("postgresql",)),
+        CreateIndex("ix_books_price_desc_nulls_last", "price DESC NULLS LAST, isbn", dialects=("postgresql",)),
+    ]),
+]
+
+
+async def applied_versions(conn):
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def migrate(engine):
+    """Apply pending migrations; returns the versions applied by this call"""
+    dialect = engine.dialect.name
+    applied = []
+    async with engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY refuses to run inside a transaction
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if dialect == "postgresql":
+            locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})).scalar()
+            if not locked:
+                print("[DEBUG] Another process is running migrations, skipping")
+                return applied
+        try:
+            done = await applied_versions(conn)
+            for migration in MIGRATIONS:
+                if migration.version in done:
+                    continue
+                print(f"[DEBUG] Applying migration {migration.version}: {migration.name}")
+                # Every step is idempotent, so a migration that fails halfway
+                # is simply retried from the start next time
+                for step in migration.steps:
+                    await step.apply(conn, dialect)
+                await conn.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                    {"version": migration.version, "name": migration.name},
+                )
+                applied.append(migration.version)
+        finally:
+            if dialect == "postgresql":
+                await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+    return applied
+
+
+async def status(engine):
+    async with engine.begin() as conn:
+        done = await applied_versions(conn)
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version in done else "pending"
+        print(f"{migration.version:>4}  {state:<8} {migration.name}")
+
+
+async def run(command):
+    from main import engine
+
+    try:
+        if command == "status":
+            await status(engine)
+        else:
+            applied = await migrate(engine)
+            print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
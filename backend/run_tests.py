@@ -69,7 +69,9 @@ def main():
             "comprehensive_test", 
             "test_auth_flow",
             "test_database",
-            "diagnose_500_error"
+            "diagnose_500_error",
+            "test_import_parsers",
+            "test_sorted_pagination"
         ]
         
         print("\n🧪 Running key backend tests...")
@@ -0,0 +1,54 @@
+# Typed request models for the E-Book Manager write endpoints
+
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+
+class BookIn(BaseModel):
+    """A book as sent to PUT /books/{isbn} and POST /books:bulk
+
+    Field names and formats match the read endpoints; price and rating may
+    be sent as numbers or strings, and an empty string means "not set".
+    """
+
+    model_config = ConfigDict(extra="ignore")
+
+    ISBN: str = Field(min_length=1, max_length=20)
+    title: str
+    author: str
+    year: Optional[int]
+    publisher: str
+    cover: str
+    genre: str = ""
+    price: Optional[Decimal] = Field(None, ge=0, max_digits=10, decimal_places=2)
+    rating: Optional[Decimal] = Field(None, ge=0, max_digits=3, decimal_places=1)
+
+    @field_validator("year", "price", "rating", mode="before")
+    @classmethod
+    def empty_is_none(cls, value):
+        return None if value == "" else value
+
+    def to_row(self):
+        """Book attribute -> value, the same shape normalize_book() returns"""
+        return {
+            "isbn": self.ISBN,
+            "title": self.title,
+            "author": self.author,
+            "year": self.year,
+            "publisher": self.publisher,
+            "cover": self.cover,
+            "genre": self.genre,
+            "price": self.price,
+            "rating": self.rating,
+        }
+
+
+def error_message(error):
+    """One line summary of a pydantic ValidationError"""
+    parts = []
+    for item in error.errors():
+        location = ".".join(str(part) for part in item["loc"])
+        parts.append(f"{location}: {item['msg']}" if location else item["msg"])
+    return "; ".join(parts)
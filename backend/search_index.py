@@ -0,0 +1,167 @@
+# In-memory full-text index over the book catalog
+#
+# Title, author, publisher and genre are tokenized (case folded, accents
+# stripped) into an inverted index: token -> {doc id: field weight}. A query
+# intersects the postings of its tokens, starting from the rarest, and ranks
+# the matches by weight times inverse document frequency. Documents are
+# added, replaced and removed one at a time, so writes never force a rebuild.
+#
+# Scoring is proportional to the number of matches, so it runs in a worker
+# thread, and the top results of recent queries are kept in a small LRU
+# cache. A write only drops the cached queries that share a token with the
+# book it changes.
+
+import asyncio
+import heapq
+import math
+import re
+import unicodedata
+from collections import OrderedDict
+
+# Field weights used for ranking; a title match counts most
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "publisher": 1.0, "genre": 1.0}
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold(text):
+    """Lower-case text and strip accents, e.g. "Émile" -> "emile" """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex:
+    def __init__(self, cache_size=256, cache_depth=1000):
+        self.cache_size = cache_size
+        self.cache_depth = cache_depth  # ranked hits kept per cached query
+        self._cache = OrderedDict()  # query tokens -> (total, ranked hits)
+        self._cached_by_token = {}  # token -> cached query tokens containing it
+        self._writes = 0
+        self._token_writes = {}  # token -> self._writes at its last change
+        self.postings = {}  # token -> {doc id: weight}
+        self.doc_ids = {}  # isbn -> doc id
+        self.isbns = []  # doc id -> isbn (None once removed)
+        self.doc_tokens = []  # doc id -> tokens, needed to remove the doc again
+        self.free_ids = []
+        self.ready = False
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, isbn, fields):
+        """Index (or re-index) one book; fields maps field name -> text"""
+        self.remove(isbn)
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                weights[token] = weights.get(token, 0.0) + weight
+        self._changed(weights)
+        doc_id = self.free_ids.pop() if self.free_ids else len(self.isbns)
+        if doc_id == len(self.isbns):
+            self.isbns.append(isbn)
+            self.doc_tokens.append(tuple(weights))
+        else:
+            self.isbns[doc_id] = isbn
+            self.doc_tokens[doc_id] = tuple(weights)
+        self.doc_ids[isbn] = doc_id
+        for token, weight in weights.items():
+            self.postings.setdefault(token, {})[doc_id] = weight
+
+    def remove(self, isbn):
+        doc_id = self.doc_ids.pop(isbn, None)
+        if doc_id is None:
+            return
+        self._changed(self.doc_tokens[doc_id])
+        for token in self.doc_tokens[doc_id]:
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[token]
+        self.isbns[doc_id] = None
+        self.doc_tokens[doc_id] = ()
+        self.free_ids.append(doc_id)
+
+    def _changed(self, tokens):
+        # Postings (and so document frequencies) of these tokens change:
+        # drop every cached query that uses one of them
+        self._writes += 1
+        for token in tokens:
+            self._token_writes[token] = self._writes
+            for key in self._cached_by_token.pop(token, ()):
+                self._forget(key)
+
+    def _forget(self, key):
+        if self._cache.pop(key, None) is None:
+            return
+        for token in key:
+            keys = self._cached_by_token.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cached_by_token[token]
+
+    async def search(self, query, limit, offset=0):
+        """Return (total matches, [(isbn, score), ...]) for one page of ranked results
+
+        Every query token must match (AND). Ties are broken by ISBN so
+        pagination is stable.
+        """
+        tokens = tuple(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return 0, []
+        depth = offset + limit
+        cached = self._cache.get(tokens)
+        if cached is not None and (depth <= len(cached[1]) or len(cached[1]) == cached[0]):
+            self._cache.move_to_end(tokens)
+            return cached[0], cached[1][offset:depth]
+        writes = self._writes
+        total, hits = await asyncio.to_thread(self._rank, tokens, max(depth, self.cache_depth))
+        # Writes go on while the thread ranks; a result that may have seen
+        # one half-applied is returned but not cached
+        if all(self._token_writes.get(token, 0) <= writes for token in tokens):
+            self._forget(tokens)
+            self._cache[tokens] = (total, hits)
+            for token in tokens:
+                self._cached_by_token.setdefault(token, set()).add(tokens)
+            if len(self._cache) > self.cache_size:
+                self._forget(next(iter(self._cache)))
+        return total, hits[offset:depth]
+
+    def _rank(self, tokens, depth):
+        # Runs in a worker thread while the event loop keeps writing:
+        # iterate over copies, and skip documents removed meanwhile
+        postings = []
+        for token in tokens:
+            posting = self.postings.get(token)
+            if not posting:
+                return 0, []
+            postings.append(posting)
+        postings.sort(key=len)
+        total_docs = len(self.doc_ids)
+        idf = [math.log(1.0 + total_docs / max(len(p), 1)) for p in postings]
+        smallest, rest = postings[0], postings[1:]
+        isbns = self.isbns
+        scores = {}
+        for doc_id in list(smallest):  # copying only the keys is quick
+            weight = smallest.get(doc_id)
+            if weight is None:
+                continue
+            score = weight * idf[0]
+            for i, posting in enumerate(rest, start=1):
+                other = posting.get(doc_id)
+                if other is None:
+                    break
+                score += other * idf[i]
+            else:
+                isbn = isbns[doc_id]
+                if isbn is not None:
+                    scores[isbn] = score
+        top = heapq.nsmallest(depth, scores.items(), key=lambda item: (-item[1], item[0]))
+        return len(scores), [(isbn, round(score, 4)) for isbn, score in top]
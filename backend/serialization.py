@@ -0,0 +1,74 @@
+# Response serialization for the E-Book Manager backend
+#
+# Book rows are selected as plain Core tuples and turned into response dicts
+# by a function built once per field list: the row is zipped with the field
+# names and only the fields that need formatting are touched. JSON is encoded with orjson when it is
+# installed; either way the bytes are exactly what FastAPI's JSONResponse
+# produces (compact separators, non-ASCII characters left unescaped).
+
+import json
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library gives the same bytes
+    orjson = None
+
+def _decimal(value):
+    # Numeric columns have always been returned as strings, "" when unset
+    return str(value) if value is not None else ""
+
+
+def _text(value):
+    return value or ""
+
+
+# How API fields are rendered from column values; fields not listed are
+# passed through unchanged
+FIELD_FORMATS = {
+    "genre": _text,
+    "price": _decimal,
+    "rating": _decimal,
+}
+
+
+@lru_cache(maxsize=256)
+def row_formatter(fields):
+    """Build a function mapping a row (field i at row[i]) to a response dict
+
+    fields is a tuple of API field names.
+    """
+    formats = tuple((name, FIELD_FORMATS[name]) for name in fields if name in FIELD_FORMATS)
+
+    def format_row(row):
+        item = dict(zip(fields, row))
+        for name, format_field in formats:
+            item[name] = format_field(item[name])
+        return item
+
+    return format_row
+
+
+def format_value(field, value):
+    """Format one column value the way the API returns it"""
+    return row_formatter((field,))((value,))[field]
+
+
+def encode_json(value):
+    """Encode a value the same way FastAPI's JSONResponse does"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with encode_json()
+
+    Returning one directly from an endpoint also skips FastAPI's
+    jsonable_encoder pass, which dominates the cost of large lists.
+    """
+
+    def render(self, content):
+        return encode_json(content)
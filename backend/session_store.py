@@ -0,0 +1,408 @@
+# In-process session token store for the E-Book Manager backend
+#
+# The in-memory token set is the source of truth while the server runs.
+# Changes are written back to sessions.pkl in the background, and a watcher
+# task picks up edits made by other processes (e.g. the helper scripts in
+# tests/) by comparing the file's inode/mtime/size instead of re-reading it.
+#
+# Every token carries an expiry timestamp. Tokens are kept in LRU order so the
+# store can be capped at a maximum number of live sessions, and a sweeper task
+# purges expired tokens in batches.
+#
+# SessionStore keeps everything in one process and is fine for a single
+# uvicorn worker. SqliteSessionStore shares sessions between workers through a
+# SQLite database in WAL mode, with a small per-worker read-through cache.
+
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def read_tokens(path, ttl=None):
+    """Read {token: expires_at} from a sessions file, returning {} on any error
+
+    Files written before expiry was tracked hold a plain list/set of tokens;
+    those tokens get a fresh ttl from now.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print("[DEBUG] Failed to load sessions:", str(e))
+        return {}
+    if isinstance(data, dict):
+        return data
+    if isinstance(data, (list, set)):
+        expires_at = time.time() + ttl if ttl else float("inf")
+        return {token: expires_at for token in data}
+    return {}
+
+
+def write_tokens(path, tokens, ttl=None):
+    """Atomically replace the sessions file so readers never see a partial pickle
+
+    tokens is a {token: expires_at} mapping, or any iterable of tokens which
+    then get a fresh ttl from now.
+    """
+    if not isinstance(tokens, dict):
+        expires_at = time.time() + ttl if ttl else float("inf")
+        tokens = {token: expires_at for token in tokens}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(dict(tokens), f)
+    os.replace(tmp_path, path)
+
+
+def file_signature(path):
+    """Cheap change detector for the sessions file: (inode, mtime, size)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class SessionStore:
+    """Single-process store persisted to a pickle file"""
+
+    def __init__(self, path, check_interval=2.0, ttl=8 * 60 * 60, sliding=False,
+                 max_sessions=None, sweep_interval=60.0, sweep_batch_size=1000):
+        self.path = path
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self.sliding = sliding
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self.tokens = OrderedDict()  # token -> expires_at, least recently used first
+        self._unsaved = {}  # added or extended locally but not yet written to disk
+        self._signature = None
+        self._dirty = False
+        self._flush_task = None
+        self._watch_task = None
+        self._sweep_task = None
+        self.evictions = 0
+        self.expirations = 0
+
+    def load(self):
+        """Synchronously (re)load tokens from disk, keeping unsaved local changes"""
+        self._apply(read_tokens(self.path, self.ttl), file_signature(self.path))
+
+    def _apply(self, tokens, signature):
+        now = time.time()
+        merged = OrderedDict(sorted(
+            ((token, expires_at) for token, expires_at in tokens.items() if expires_at > now),
+            key=lambda item: item[1],
+        ))
+        merged.update(self._unsaved)
+        self.tokens = merged
+        self._evict()
+        self._signature = signature
+        print(f"[DEBUG] Loaded {len(self.tokens)} session token(s) from file")
+
+    async def is_valid(self, token):
+        expires_at = self.tokens.get(token)
+        if expires_at is None:
+            return False
+        now = time.time()
+        if expires_at <= now:
+            await self.remove(token)
+            self.expirations += 1
+            return False
+        self.tokens.move_to_end(token)
+        if self.sliding:
+            # Extended expiry is persisted by the next sweep rather than on
+            # every request, so validation never schedules disk I/O.
+            self.tokens[token] = self._unsaved[token] = now + self.ttl
+            self._dirty = True
+        return True
+
+    async def add(self, token):
+        self.tokens[token] = self._unsaved[token] = time.time() + self.ttl
+        self._evict()
+        self._schedule_flush()
+
+    async def remove(self, token):
+        if self.tokens.pop(token, None) is not None:
+            self._unsaved.pop(token, None)
+            self._schedule_flush()
+
+    def _evict(self):
+        if self.max_sessions is None:
+            return
+        while len(self.tokens) > self.max_sessions:
+            token, _ = self.tokens.popitem(last=False)
+            self._unsaved.pop(token, None)
+            self.evictions += 1
+            self._dirty = True
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def _schedule_flush(self):
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. a helper script): just write synchronously
+            self._write()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush())
+
+    def _snapshot(self):
+        self._dirty = False
+        return dict(self.tokens), dict(self._unsaved)
+
+    def _written(self, unsaved, signature):
+        for token, expires_at in unsaved.items():
+            if self._unsaved.get(token) == expires_at:
+                del self._unsaved[token]
+        self._signature = signature
+
+    def _write_file(self, tokens):
+        write_tokens(self.path, tokens)
+        return file_signature(self.path)
+
+    def _write(self):
+        tokens, unsaved = self._snapshot()
+        self._written(unsaved, self._write_file(tokens))
+
+    async def _flush(self):
+        # Coalesces bursts of changes into as few writes as possible. The
+        # snapshot is taken on the event loop so the writer thread never
+        # iterates a set that is being mutated.
+        while self._dirty:
+            tokens, unsaved = self._snapshot()
+            try:
+                signature = await asyncio.to_thread(self._write_file, tokens)
+            except Exception as e:
+                print("[DEBUG] Failed to save sessions:", str(e))
+                return
+            self._written(unsaved, signature)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                signature = await asyncio.to_thread(file_signature, self.path)
+                flushing = self._flush_task is not None and not self._flush_task.done()
+                if signature != self._signature and not flushing:
+                    print("[DEBUG] Sessions file changed on disk, reloading")
+                    tokens = await asyncio.to_thread(read_tokens, self.path, self.ttl)
+                    self._apply(tokens, signature)
+            except Exception as e:
+                print("[DEBUG] Failed to check sessions file:", str(e))
+
+    async def sweep(self):
+        """Purge expired tokens, yielding to the event loop between batches"""
+        now = time.time()
+        snapshot = list(self.tokens.items())
+        purged = 0
+        for start in range(0, len(snapshot), self.sweep_batch_size):
+            for token, expires_at in snapshot[start:start + self.sweep_batch_size]:
+                # Re-check against the live entry; it may have slid forward
+                if expires_at <= now and self.tokens.get(token, now + 1) <= now:
+                    del self.tokens[token]
+                    self._unsaved.pop(token, None)
+                    purged += 1
+            await asyncio.sleep(0)
+        self.expirations += purged
+        if purged or self._dirty:
+            self._schedule_flush()
+        return purged
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                purged = await self.sweep()
+                if purged:
+                    print(f"[DEBUG] Purged {purged} expired session token(s)")
+            except Exception as e:
+                print("[DEBUG] Failed to sweep sessions:", str(e))
+
+    def start(self):
+        """Start the file watcher and sweeper tasks; call from the app's startup hook"""
+        loop = asyncio.get_running_loop()
+        if self._watch_task is None:
+            self._watch_task = loop.create_task(self._watch())
+        if self._sweep_task is None:
+            self._sweep_task = loop.create_task(self._sweep())
+
+    async def stop(self):
+        """Stop the background tasks and flush any pending changes"""
+        for task in (self._watch_task, self._sweep_task):
+            if task is not None:
+                task.cancel()
+        self._watch_task = self._sweep_task = None
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._dirty:
+            await self._flush()
+
+
+class SqliteSessionStore:
+    """Store shared by several worker processes through a SQLite file in WAL mode
+
+    The database is the source of truth. Each worker caches validated tokens
+    for cache_ttl seconds, so the hot path is a dict lookup and a token
+    removed by another worker stops working within that window.
+    """
+
+    def __init__(self, path, ttl=8 * 60 * 60, sliding=False, max_sessions=None,
+                 sweep_interval=60.0, sweep_batch_size=1000, cache_size=10000, cache_ttl=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.sliding = sliding
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()  # token -> (expires_at, cached_at)
+        self._touched = {}  # sliding extensions not yet written to the database
+        self._lock = threading.Lock()
+        self._conn = None
+        self._sweep_task = None
+        self.evictions = 0
+        self.expirations = 0
+
+    def load(self):
+        """Open the database and create the sessions table if needed"""
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+        print(f"[DEBUG] Using shared session database {self.path}")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _insert(self, token, expires_at):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (token, expires_at))
+                evicted = []
+                if self.max_sessions is not None:
+                    # Keep the max_sessions entries that expire last
+                    evicted = self._conn.execute(
+                        "DELETE FROM sessions WHERE token IN "
+                        "(SELECT token FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?) RETURNING token",
+                        (self.max_sessions,),
+                    ).fetchall()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return evicted
+
+    def _cache_put(self, token, expires_at):
+        self._cache[token] = (expires_at, time.monotonic())
+        self._cache.move_to_end(token)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def is_valid(self, token):
+        now = time.time()
+        cached = self._cache.get(token)
+        if cached is not None and time.monotonic() - cached[1] < self.cache_ttl:
+            expires_at = cached[0]
+            self._cache.move_to_end(token)
+        else:
+            rows = await asyncio.to_thread(self._execute, "SELECT expires_at FROM sessions WHERE token = ?", (token,))
+            if not rows:
+                self._cache.pop(token, None)
+                return False
+            expires_at = max(rows[0][0], self._touched.get(token, 0))
+            self._cache_put(token, expires_at)
+        if expires_at <= now:
+            self._cache.pop(token, None)
+            self._touched.pop(token, None)
+            self.expirations += 1
+            return False
+        if self.sliding:
+            # Written back in batches by the sweeper, not per request
+            self._touched[token] = now + self.ttl
+            self._cache_put(token, now + self.ttl)
+        return True
+
+    async def add(self, token):
+        expires_at = time.time() + self.ttl
+        evicted = await asyncio.to_thread(self._insert, token, expires_at)
+        for (old_token,) in evicted:
+            self._cache.pop(old_token, None)
+        self.evictions += len(evicted)
+        self._cache_put(token, expires_at)
+
+    async def remove(self, token):
+        self._cache.pop(token, None)
+        self._touched.pop(token, None)
+        await asyncio.to_thread(self._execute, "DELETE FROM sessions WHERE token = ?", (token,))
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM sessions")[0][0]
+
+    async def _write_touched(self):
+        touched, self._touched = self._touched, {}
+        if touched:
+            def write():
+                with self._lock:
+                    self._conn.executemany(
+                        "UPDATE sessions SET expires_at = MAX(expires_at, ?) WHERE token = ?",
+                        [(expires_at, token) for token, expires_at in touched.items()],
+                    )
+            await asyncio.to_thread(write)
+
+    async def sweep(self):
+        """Write back sliding extensions, then delete expired rows in batches"""
+        await self._write_touched()
+        now = time.time()
+        purged = 0
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                "DELETE FROM sessions WHERE token IN "
+                "(SELECT token FROM sessions WHERE expires_at <= ? LIMIT ?) RETURNING token",
+                (now, self.sweep_batch_size),
+            )
+            for (token,) in rows:
+                self._cache.pop(token, None)
+            purged += len(rows)
+            if len(rows) < self.sweep_batch_size:
+                break
+        self.expirations += purged
+        return purged
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                purged = await self.sweep()
+                if purged:
+                    print(f"[DEBUG] Purged {purged} expired session token(s)")
+            except Exception as e:
+                print("[DEBUG] Failed to sweep sessions:", str(e))
+
+    def start(self):
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def stop(self):
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+        await self._write_touched()
@@ -0,0 +1,70 @@
+# Stateless HMAC-signed bearer tokens for the E-Book Manager backend
+#
+# A token looks like "v1.<kid>.<issued_at>.<expires_at>.<signature>" where the
+# signature is an HMAC-SHA256 over everything before it, keyed by the secret
+# registered under <kid>. Checking a token needs no session store, so any
+# number of worker processes can validate it without shared state. Keeping
+# several key ids registered lets old tokens verify while new ones are signed
+# with the active key.
+
+import base64
+import hashlib
+import hmac
+import time
+
+TOKEN_VERSION = "v1"
+
+
+def derive_key(secret, kid):
+    """Derive a per-key-id signing key from a shared secret"""
+    return hmac.new(secret.encode("utf-8"), f"ebook-token-key:{kid}".encode("utf-8"), hashlib.sha256).digest()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+class TokenSigner:
+    def __init__(self, keys, active_kid, ttl):
+        """keys maps key id -> signing key bytes; active_kid signs new tokens"""
+        if active_kid not in keys:
+            raise ValueError(f"Active token key id {active_kid!r} is not configured")
+        for kid in keys:
+            if "." in kid:
+                raise ValueError(f"Token key id {kid!r} must not contain '.'")
+        self.keys = dict(keys)
+        self.active_kid = active_kid
+        self.ttl = ttl
+
+    def _sign(self, key, payload):
+        return _b64(hmac.new(key, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self):
+        issued_at = int(time.time())
+        payload = f"{TOKEN_VERSION}.{self.active_kid}.{issued_at}.{issued_at + self.ttl}"
+        return f"{payload}.{self._sign(self.keys[self.active_kid], payload)}"
+
+    def verify(self, token):
+        """Return True if token was signed by a registered key and has not expired"""
+        # Tokens we issue are ASCII; anything else would make the HMAC
+        # comparison (or encoding the payload) raise instead of failing
+        if not token.isascii():
+            return False
+        parts = token.split(".")
+        if len(parts) != 5 or parts[0] != TOKEN_VERSION:
+            return False
+        _, kid, _, expires_at, signature = parts
+        key = self.keys.get(kid)
+        if key is None:
+            return False
+        payload = token[:token.rindex(".")]
+        if not hmac.compare_digest(signature, self._sign(key, payload)):
+            return False
+        try:
+            return int(expires_at) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def looks_signed(token):
+        return token.startswith(TOKEN_VERSION + ".")
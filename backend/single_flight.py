@@ -0,0 +1,70 @@
+# Single-flight request coalescing
+#
+# Concurrent calls with the same key share one execution: the first caller
+# starts the call as its own task and everybody, the first caller included,
+# awaits that task. A caller that is cancelled (e.g. its client disconnected)
+# only stops waiting; the shared call keeps running for the others and is
+# cancelled only once nobody is waiting for it any more. Results are not
+# kept after the call finishes, so this is not a cache: a request that
+# arrives later starts a fresh call.
+
+import asyncio
+import functools
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # key -> [task, number of waiters]
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Return await fn(*args, **kwargs), sharing it with concurrent callers using key"""
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.get_running_loop().create_task(fn(*args, **kwargs))
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(functools.partial(self._forget, key, task))
+            self.calls += 1
+        else:
+            self.shared += 1
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        except asyncio.CancelledError:
+            if call[1] == 1 and not call[0].done():
+                # Last waiter gone: stop the call, and let newcomers start afresh
+                self._forget(key, call[0], None)
+                call[0].cancel()
+            raise
+        finally:
+            call[1] -= 1
+
+    def _forget(self, key, task, _):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "calls": self.calls, "shared": self.shared}
+
+
+def single_flight(key=None):
+    """Decorate an async function so concurrent calls with the same key share one run
+
+    key(*args, **kwargs) builds the key; by default the arguments themselves
+    (which must then be hashable). The SingleFlight is available as .flight.
+    """
+
+    def decorate(fn):
+        flight = SingleFlight()
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key is not None else (args, tuple(sorted(kwargs.items())))
+            return await flight.do(k, fn, *args, **kwargs)
+
+        wrapper.flight = flight
+        return wrapper
+
+    return decorate
@@ -0,0 +1,177 @@
+# In-memory prefix index for title / author typeahead
+#
+# Every distinct title and author is one suggestion, keyed by its folded text
+# (see search_index.fold) in a sorted list, so the suggestions for a prefix
+# are one contiguous slice found with binary search. Suggestions rank by their
+# best book rating, then by popularity (how many books share the title or
+# author). Short prefixes cover huge slices, so the ranked top of any slice
+# wider than scan_limit is cached per prefix and patched on every write; the
+# shortest prefixes are cached up front once the initial load is done.
+
+import bisect
+import heapq
+import re
+
+from search_index import fold
+
+KINDS = ("title", "author")
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fold_prefix(text):
+    """Fold text the way keys are folded, keeping a trailing space"""
+    return _SPACE_RE.sub(" ", fold(text)).lstrip()
+
+
+class Suggestion:
+    __slots__ = ("kind", "text", "ratings", "rank")
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+        self.ratings = {}  # isbn -> rating (None if unrated)
+        self.rank = None
+
+    def update_rank(self, key):
+        best = max((r for r in self.ratings.values() if r is not None), default=None)
+        self.rank = (-(best if best is not None else -1), -len(self.ratings), key)
+
+    def best(self):
+        """(isbn, rating) of the best rated book behind this suggestion"""
+        return min(self.ratings.items(), key=lambda item: (-(item[1] if item[1] is not None else -1), item[0]))
+
+
+class SuggestIndex:
+    def __init__(self, max_k=10, scan_limit=64, warm_depth=3):
+        self.max_k = max_k
+        self.scan_limit = scan_limit
+        self.warm_depth = warm_depth
+        # Cached lists keep some spare entries, so a suggestion dropping out
+        # of a top list rarely forces a rescan
+        self.cache_depth = max_k * 3
+        self.keys = []  # sorted (folded text, kind); unsorted while loading
+        self.suggestions = {}  # (folded text, kind) -> Suggestion
+        self.books = {}  # isbn -> keys the book contributes to
+        self._top = {}  # prefix -> ranked keys, for prefixes wider than scan_limit
+        self._ready = False
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def ready(self):
+        return self._ready
+
+    @ready.setter
+    def ready(self, ready):
+        # The initial load appends keys; sort them once instead of per insert
+        if ready and not self._ready:
+            self.keys.sort()
+            self._warm()
+        self._ready = ready
+
+    def _warm(self):
+        for length in range(1, self.warm_depth + 1):
+            lo = 0
+            while lo < len(self.keys):
+                prefix = self.keys[lo][0][:length]
+                if len(prefix) < length:
+                    lo += 1
+                    continue
+                hi = bisect.bisect_left(self.keys, (prefix + "\U0010ffff",), lo)
+                if hi - lo > self.scan_limit:
+                    self._top[prefix] = self._rank_range(lo, hi, self.cache_depth)
+                lo = hi
+
+    def add(self, isbn, fields):
+        """Index (or re-index) one book; fields maps field name -> value"""
+        self.remove(isbn)
+        keys = []
+        for kind in KINDS:
+            text = _SPACE_RE.sub(" ", (fields.get(kind) or "")).strip()
+            folded = fold_prefix(text).rstrip()
+            if not folded:
+                continue
+            key = (folded, kind)
+            suggestion = self.suggestions.get(key)
+            if suggestion is None:
+                suggestion = self.suggestions[key] = Suggestion(kind, text)
+                if self._ready:
+                    bisect.insort(self.keys, key)
+                else:
+                    self.keys.append(key)
+            suggestion.ratings[isbn] = fields.get("rating")
+            suggestion.update_rank(key)
+            keys.append(key)
+            # More books or a better rating only move a suggestion up; one
+            # that is not listed yet must beat the last entry to get in
+            for prefix in self._cached_prefixes(folded):
+                ranked = self._top[prefix]
+                if key in ranked:
+                    ranked.remove(key)
+                elif self._rank(key) > self._rank(ranked[-1]):
+                    continue
+                bisect.insort(ranked, key, key=self._rank)
+                del ranked[self.cache_depth:]
+        self.books[isbn] = keys
+
+    def remove(self, isbn):
+        for key in self.books.pop(isbn, ()):
+            suggestion = self.suggestions[key]
+            del suggestion.ratings[isbn]
+            if suggestion.ratings:
+                suggestion.update_rank(key)
+            else:
+                del self.suggestions[key]
+                if self._ready:
+                    del self.keys[bisect.bisect_left(self.keys, key)]
+                else:
+                    self.keys.remove(key)
+            for prefix in self._cached_prefixes(key[0]):
+                ranked = self._top[prefix]
+                if key not in ranked:
+                    continue
+                # Everything outside the list ranks below its last entry, so
+                # the suggestion may only stay if it still ranks above that
+                ranked.remove(key)
+                if key in self.suggestions and ranked and self._rank(key) < self._rank(ranked[-1]):
+                    bisect.insort(ranked, key, key=self._rank)
+                if len(ranked) < self.max_k:
+                    del self._top[prefix]  # recomputed by the next lookup
+
+    def _cached_prefixes(self, folded):
+        return [folded[:n] for n in range(1, len(folded) + 1) if folded[:n] in self._top]
+
+    def _rank(self, key):
+        return self.suggestions[key].rank
+
+    def _rank_range(self, lo, hi, k):
+        return heapq.nsmallest(k, self.keys[lo:hi], key=self._rank)
+
+    def suggest(self, prefix, k):
+        """Return up to k suggestions whose text starts with prefix, best first"""
+        prefix = fold_prefix(prefix)
+        if not prefix:
+            return []
+        k = min(k, self.max_k)
+        ranked = self._top.get(prefix)
+        if ranked is None:
+            lo = bisect.bisect_left(self.keys, (prefix,))
+            hi = bisect.bisect_left(self.keys, (prefix + "\U0010ffff",), lo)
+            if hi - lo > self.scan_limit:
+                ranked = self._top[prefix] = self._rank_range(lo, hi, self.cache_depth)
+            else:
+                ranked = self._rank_range(lo, hi, k)
+        results = []
+        for key in ranked[:k]:
+            suggestion = self.suggestions[key]
+            isbn, rating = suggestion.best()
+            results.append({
+                "type": suggestion.kind,
+                "text": suggestion.text,
+                "rating": rating,
+                "books": len(suggestion.ratings),
+                "ISBN": isbn,
+            })
+        return results
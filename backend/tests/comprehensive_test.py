@@ -113,7 +113,7 @@ def comprehensive_test():
     # Step 4: Test book retrieval and verify new fields
     print("\n4. Testing book retrieval with new fields...")
     try:
-        response = requests.get(f"{base_url}/books", headers=headers)
+        response = requests.get(f"{base_url}/books", params={"all": "true"}, headers=headers)
         if response.status_code == 200:
             books = response.json()
             print(f"✓ Retrieved {len(books)} books from database")
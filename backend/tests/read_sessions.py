@@ -4,6 +4,7 @@ Read and display the contents of sessions.pkl
 """
 import pickle
 import os
+import time
 
 SESSIONS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "sessions.pkl")
 
@@ -22,7 +23,13 @@ def read_sessions_file():
             print(f"Raw data from file: {sessions}")
             print(f"Data type: {type(sessions)}")
             
-            if isinstance(sessions, list):
+            if isinstance(sessions, dict):
+                now = time.time()
+                print(f"Number of sessions: {len(sessions)}")
+                for i, (token, expires_at) in enumerate(sessions.items()):
+                    status = "expired" if expires_at <= now else f"expires in {int(expires_at - now)}s"
+                    print(f"Token {i}: {token} ({status})")
+            elif isinstance(sessions, list):
                 print(f"Number of sessions: {len(sessions)}")
                 for i, token in enumerate(sessions):
                     print(f"Token {i}: {token} (type: {type(token)})")
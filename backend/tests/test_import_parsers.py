@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+IMPORT PARSERS TEST - E-Book Manager Backend
+
+Feeds the incremental JSON and CSV import parsers the same input split into
+chunks at random byte positions and checks that every split gives the same
+records as parsing the whole input at once:
+- Numbers split after "." or "e" ("[2." + "5]")
+- Multi-byte UTF-8 characters split across chunks
+- Quoted CSV fields spanning lines
+- Trailing data after the JSON array, in the same or a later chunk
+- Unterminated CSV lines (no "\\n", e.g. CR-only files) hitting MAX_RECORD_CHARS
+
+Runs without the server or database.
+Usage: python test_import_parsers.py
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import import_parsers
+from import_parsers import ImportParseError, iter_csv_lines, iter_json_array
+
+SPLITS_PER_INPUT = 200
+
+JSON_INPUTS = [
+    '[2.5, 1e+3, -0.25, 3E-2, 10, 0]',
+    '[{"ISBN": "1", "title": "Les Misérables", "price": 12.5}, {"ISBN": "2", "title": "日本語", "rating": 4}]',
+    '[ "a", true, false, null, [1, [2.75]], {"nested": {"x": -1.5e10}} ]',
+    '[]',
+]
+
+CSV_INPUT = (
+    'ISBN,Book-Title,Book-Author\n'
+    '1,"Multi\nline, title",Hugo\n'
+    '2,Émile,"Zola ""the"" writer"\n'
+    '3,Plain,Author\n'
+)
+
+
+async def chunks_of(data, cuts):
+    start = 0
+    for cut in cuts + [len(data)]:
+        if cut > start:
+            yield data[start:cut]
+            start = cut
+
+
+def random_cuts(data, rng):
+    return sorted(rng.sample(range(1, len(data)), min(len(data) - 1, rng.randint(1, 8))))
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+def check(name, passed, detail=""):
+    print(f"{'✓' if passed else '✗'} {name}" + (f": {detail}" if detail and not passed else ""))
+    return passed
+
+
+async def test_json_splits(rng):
+    passed = True
+    for text in JSON_INPUTS:
+        data = text.encode("utf-8")
+        expected = json.loads(text)
+        for _ in range(SPLITS_PER_INPUT):
+            cuts = random_cuts(data, rng)
+            try:
+                got = await collect(iter_json_array(chunks_of(data, cuts)))
+            except ImportParseError as e:
+                got = e
+            if got != expected:
+                return check(f"JSON split {text[:30]!r}", False, f"cuts {cuts} gave {got!r}")
+        passed &= check(f"JSON split {text[:30]!r} ({SPLITS_PER_INPUT} random splits)", True)
+    return passed
+
+
+async def test_json_trailing_data():
+    passed = True
+    for parts in (["[] x"], ["[]", " x"], ["[1, 2]", "  ", "3"], ["[1]", "\n]"]):
+        try:
+            await collect(iter_json_array(chunks_of(b"".join(p.encode() for p in parts), _cuts(parts))))
+        except ImportParseError:
+            passed &= check(f"JSON trailing data rejected {parts!r}", True)
+        else:
+            passed &= check(f"JSON trailing data rejected {parts!r}", False, "was accepted")
+    got = await collect(iter_json_array(chunks_of(b"[1] \n", [3])))
+    passed &= check("JSON trailing whitespace accepted", got == [1], repr(got))
+    return passed
+
+
+def _cuts(parts):
+    cuts, position = [], 0
+    for part in parts[:-1]:
+        position += len(part.encode())
+        cuts.append(position)
+    return cuts
+
+
+async def test_csv_splits(rng):
+    data = CSV_INPUT.encode("utf-8")
+    expected = list(csv.reader(io.StringIO(CSV_INPUT)))
+    for _ in range(SPLITS_PER_INPUT):
+        cuts = random_cuts(data, rng)
+        lines = await collect(iter_csv_lines(chunks_of(data, cuts)))
+        got = [next(csv.reader([line])) for line in lines]
+        if got != expected:
+            return check("CSV split", False, f"cuts {cuts} gave {got!r}")
+    return check(f"CSV split ({SPLITS_PER_INPUT} random splits)", True)
+
+
+async def test_csv_unterminated_line():
+    limit = import_parsers.MAX_RECORD_CHARS
+    import_parsers.MAX_RECORD_CHARS = 100
+    try:
+        data = b"ISBN,title\r" + b"1,Some title\r" * 50
+        await collect(iter_csv_lines(chunks_of(data, list(range(10, len(data), 10)))))
+    except ImportParseError:
+        return check("CR-only CSV stops at MAX_RECORD_CHARS", True)
+    finally:
+        import_parsers.MAX_RECORD_CHARS = limit
+    return check("CR-only CSV stops at MAX_RECORD_CHARS", False, "no error raised")
+
+
+async def run_all():
+    print("=== Testing Import Parsers ===")
+    rng = random.Random(int(os.environ.get("TEST_SEED", "1")))
+    results = [
+        await test_json_splits(rng),
+        await test_json_trailing_data(),
+        await test_csv_splits(rng),
+        await test_csv_unterminated_line(),
+    ]
+    return all(results)
+
+
+if __name__ == "__main__":
+    if not asyncio.run(run_all()):
+        sys.exit(1)
@@ -65,7 +65,7 @@ def test_new_fields():
     # Step 3: Test retrieving books to verify new fields
     print("\n3. Testing book retrieval with new fields...")
     try:
-        get_response = requests.get(f"{base_url}/books", headers=headers)
+        get_response = requests.get(f"{base_url}/books", params={"all": "true"}, headers=headers)
         if get_response.status_code == 200:
             books = get_response.json()
             test_book = None
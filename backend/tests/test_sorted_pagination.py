@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+SORTED PAGINATION TEST - E-Book Manager Backend
+
+Walks GET /books page by page through X-Next-Cursor for every sort order and
+checks the concatenated pages against the same listing fetched with ?all=true:
+- Every book appears exactly once, in the same order
+- Books with no value for the sort key (empty price, rating or year) come
+  last and are not dropped
+- Ties on the sort key are broken by ISBN across page boundaries
+
+The test adds its own books under a publisher unique to the run and filters
+on it, so the walk does not depend on the size of the catalog.
+Usage: python test_sorted_pagination.py
+"""
+import requests
+import sys
+import time
+
+base_url = "http://localhost:8000"
+SORTS = [None, "rating", "-rating", "price", "-price", "year", "-year"]
+PAGE_SIZES = [1, 2, 3, 5]
+
+# (price, rating, year); "" means no value. Repeated values put ties on page boundaries.
+BOOK_VALUES = [
+    ("9.99", "4.5", 2001),
+    ("", "3.0", 1999),
+    ("19.50", "", 2001),
+    ("9.99", "4.5", ""),
+    ("5.00", "2.5", 1850),
+    ("", "", ""),
+    ("19.50", "4.5", 2001),
+    ("12.00", "3.0", ""),
+    ("", "5.0", 1999),
+    ("9.99", "", 2020),
+    ("30.00", "1.0", 2001),
+]
+
+
+def login():
+    response = requests.post(f"{base_url}/login", auth=("user", "123"))
+    if response.status_code != 200:
+        print(f"✗ Login failed: {response.status_code} {response.text}")
+        return None
+    print("✓ Login successful")
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def add_test_books(headers, publisher, timestamp):
+    isbns = []
+    for i, (price, rating, year) in enumerate(BOOK_VALUES):
+        book = {
+            "ISBN": f"test-sort-{timestamp}-{i:02d}",
+            "title": f"Sorted Pagination Book {i}",
+            "author": "Tester Doe",
+            "year": year,
+            "publisher": publisher,
+            "cover": "http://example.com/sort.jpg",
+            "genre": "Testing",
+            "price": price,
+            "rating": rating,
+        }
+        response = requests.post(f"{base_url}/add-book", json=book, headers=headers)
+        if response.status_code != 200:
+            print(f"✗ Failed to add {book['ISBN']}: {response.status_code} {response.text}")
+            return None
+        isbns.append(book["ISBN"])
+    print(f"✓ Added {len(isbns)} test books under publisher {publisher!r}")
+    return isbns
+
+
+def walk_pages(headers, params, limit):
+    """Follow X-Next-Cursor until the last page; returns the ISBNs in order"""
+    isbns, cursor = [], None
+    for _ in range(len(BOOK_VALUES) + 2):
+        page_params = dict(params, limit=limit, fields="ISBN")
+        if cursor:
+            page_params["cursor"] = cursor
+        response = requests.get(f"{base_url}/books", params=page_params, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"page request failed: {response.status_code} {response.text}")
+        isbns.extend(book["ISBN"] for book in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return isbns
+    raise RuntimeError("cursor never ran out")
+
+
+def test_sort(headers, publisher, expected_isbns, sort):
+    label = sort or "default order"
+    params = {"publisher": publisher}
+    if sort:
+        params["sort"] = sort
+    response = requests.get(f"{base_url}/books", params=dict(params, all="true", fields="ISBN"), headers=headers)
+    if response.status_code != 200:
+        print(f"✗ {label}: ?all=true failed: {response.status_code} {response.text}")
+        return False
+    everything = [book["ISBN"] for book in response.json()]
+    if sorted(everything) != sorted(expected_isbns):
+        print(f"✗ {label}: ?all=true returned {len(everything)} of {len(expected_isbns)} test books")
+        return False
+
+    passed = True
+    for limit in PAGE_SIZES:
+        try:
+            walked = walk_pages(headers, params, limit)
+        except RuntimeError as e:
+            print(f"✗ {label}, limit={limit}: {e}")
+            passed = False
+            continue
+        if walked == everything:
+            print(f"✓ {label}, limit={limit}: pages match ?all=true ({len(walked)} books)")
+        else:
+            missing = sorted(set(everything) - set(walked))
+            print(f"✗ {label}, limit={limit}: pages differ from ?all=true")
+            print(f"   pages:     {walked}")
+            print(f"   all=true:  {everything}")
+            if missing:
+                print(f"   missing:   {missing}")
+            passed = False
+    return passed
+
+
+def test_sorted_pagination():
+    print("=== Testing Sorted Pagination ===")
+    headers = login()
+    if headers is None:
+        return False
+    timestamp = int(time.time())
+    publisher = f"Sorted Pagination Press {timestamp}"
+    isbns = add_test_books(headers, publisher, timestamp)
+    if isbns is None:
+        return False
+    results = [test_sort(headers, publisher, isbns, sort) for sort in SORTS]
+    return all(results)
+
+
+if __name__ == "__main__":
+    try:
+        passed = test_sorted_pagination()
+    except requests.exceptions.ConnectionError:
+        print(f"✗ Could not connect to {base_url}. Is the backend running?")
+        passed = False
+    if not passed:
+        sys.exit(1)
@@ -0,0 +1,84 @@
+# Group commit for concurrent single-row writes
+#
+# Callers submit one item and wait. Items are queued in memory and handed to
+# the flush function together once max_rows have arrived or max_delay has
+# passed since the first one, so a burst of N requests costs one statement
+# and one commit instead of N. flush(items) returns one result per item; if
+# it fails for a group, the items are retried one at a time so each caller
+# gets its own result or its own error.
+
+import asyncio
+
+
+class WriteCoalescer:
+    def __init__(self, flush, max_rows=200, max_delay=0.005, max_flushes=2):
+        self.flush = flush
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._flushes = asyncio.Semaphore(max_flushes)
+        self._pending = []  # (item, future)
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        """Queue item for the next group and return its result from flush()"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_rows:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        group, self._pending = self._pending, []
+        if group:
+            task = asyncio.get_running_loop().create_task(self._run(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group):
+        async with self._flushes:
+            # Callers that went away before the flush are not written
+            group = [(item, future) for item, future in group if not future.done()]
+            if not group:
+                return
+            self.batches += 1
+            self.items += len(group)
+            try:
+                results = await self.flush([item for item, _ in group])
+            except Exception as e:
+                if len(group) == 1:
+                    _resolve(group[0][1], error=e)
+                    return
+                print(f"[DEBUG] Group write of {len(group)} items failed ({str(e)}), retrying one by one")
+                for item, future in group:
+                    try:
+                        result = (await self.flush([item]))[0]
+                    except Exception as e:
+                        _resolve(future, error=e)
+                    else:
+                        _resolve(future, result)
+                return
+            for (_, future), result in zip(group, results):
+                _resolve(future, result)
+
+    async def close(self):
+        """Flush whatever is queued and wait for in-flight groups"""
+        self._flush_pending()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _resolve(future, result=None, error=None):
+    if future.done():  # the caller was cancelled meanwhile
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -100,7 +100,8 @@ function getSessionToken() {
 async function fetchBooks() {
     const token = getSessionToken();
     const headers = token ? { "Authorization": "Bearer " + token } : {};
-    const res = await fetch(API_URL, { headers });
+    // ?all=true is served from the backend's pre-encoded catalog snapshot
+    const res = await fetch(`${API_URL}?all=true`, { headers });
     const books = await res.json();
     renderBooks(books);
 }